@@ -1,9 +1,10 @@
+from __future__ import annotations
+
 import time
 from collections.abc import Iterable
 from itertools import batched
-from typing import Self, get_args, Literal, TypeVar
+from typing import Self, get_args, Literal, TypeVar, TYPE_CHECKING
 from threading import Thread
-import pandas as pd
 
 from sqlmodel import SQLModel, create_engine, Session
 from sqlalchemy import text
@@ -18,6 +19,9 @@ from library.database.sqlmodel_statements import (
     most_common_query,
 )
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 TERMINATOR = object()  # Queue terminator
 TableType = TypeVar("TableType", bound=SQLModel)
 
@@ -87,6 +91,8 @@ class SQLiteModelTable[TableType]:
         query = select_query(
             self.model, *args, lazy=lazy, limit=limit, offset=offset, relationships=self.relationships, **kwargs
         )
+        import pandas as pd
+
         return pd.read_sql(query, self.engine)
 
     def df_to_models(self, df: pd.DataFrame) -> list[TableType]:
@@ -168,4 +174,6 @@ class SQLiteModelTable[TableType]:
 
 
 def models_to_df(models: Iterable[TableType]) -> pd.DataFrame:
+    import pandas as pd
+
     return pd.DataFrame([model.model_dump() for model in models])
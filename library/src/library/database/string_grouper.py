@@ -303,6 +303,7 @@ class StringGrouper(object):
 
     def _set_options(self, **kwargs):
         self._config = StringGrouperConfig(**kwargs)
+        self._regex = re.compile(self._config.regex)
 
         self._max_n_matches = self._config.max_n_matches
 
@@ -380,12 +381,11 @@ class StringGrouper(object):
         :return: list of ngrams
         """
         ngram_size = self._config.ngram_size
-        regex_pattern = self._config.regex
         if self._config.ignore_case and string is not None:
             string = string.lower()  # lowercase to ignore all case
         if self._config.normalize_to_ascii:
             string = normalize("NFKD", string).encode("ASCII", "ignore").decode()
-        string = re.sub(regex_pattern, r"", string)
+        string = self._regex.sub(r"", string)
         n_grams = zip(*[string[i:] for i in range(ngram_size)])
         return ["".join(n_gram) for n_gram in n_grams]
 
@@ -405,11 +405,8 @@ class StringGrouper(object):
         if self._n_blocks is None:
             if size_guess_block != (1, 1):
                 logger.info(
-                    "n_blocks parameter is not set so data will be split into smaller chunks, n_blocks = ("
-                    + str(size_guess_block[0])
-                    + ","
-                    + str(size_guess_block[1])
-                    + ")"
+                    "n_blocks parameter is not set so data will be split into smaller chunks, n_blocks = (%d,%d)",
+                    *size_guess_block,
                 )
             self._n_blocks = size_guess_block
 
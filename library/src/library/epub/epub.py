@@ -1,7 +1,10 @@
 import logging
+import os
 import tempfile
 from collections.abc import Generator, Iterable, Callable
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import repeat
 from pathlib import Path
 from posixpath import join as posix_join, dirname as posix_dirname
 from typing import Self
@@ -10,6 +13,7 @@ from zipfile import is_zipfile, ZipFile, ZIP_STORED, ZIP_DEFLATED, ZipInfo
 from library.epub.media_type import MediaType, Category
 from library.epub.source import DirectorySource, ZipFileSource, SourceProtocol
 from library.epub.utils import strip_fragment
+from library.epub.zip_utils import CompressedMember, compress_bytes, write_compressed, zip_info_now
 from library.epub.xml_literals import CONTAINER_PATH
 from library.epub.xml_models.container_model import ContainerDocument
 from library.epub.xml_models.ncx_model import NCXDocument, NavPoint
@@ -87,6 +91,7 @@ class ResourceIndex:
         self._items: list[EPUBResource] = []
         self._by_path: dict[str, EPUBResource] = {}
         self._by_id: dict[str, EPUBResource] = {}
+        self._by_category: dict[Category, list[EPUBResource]] | None = None
         if resources:
             for r in resources:
                 self.add(r)
@@ -111,6 +116,7 @@ class ResourceIndex:
         self._by_path[resource.filename] = resource
         if resource.id is not None:
             self._by_id[resource.id] = resource
+        self._by_category = None
 
     def remove(self, resource: EPUBResource) -> None:
         """Remove a resource from the index."""
@@ -118,6 +124,7 @@ class ResourceIndex:
         self._by_path.pop(resource.filename, None)
         if resource.id is not None:
             self._by_id.pop(resource.id, None)
+        self._by_category = None
 
     def by_path(self, path: str) -> EPUBResource | None:
         """Look up a resource by its filename/path."""
@@ -127,9 +134,19 @@ class ResourceIndex:
         """Look up a resource by its manifest ID."""
         return self._by_id.get(id)
 
+    def by_category(self, category: Category) -> list[EPUBResource]:
+        """All resources of a media type category, grouped in a single pass on first use."""
+        if self._by_category is None:
+            self._by_category = {}
+            for r in self._items:
+                if r.media_type is not None:
+                    self._by_category.setdefault(r.media_type.category, []).append(r)
+        return list(self._by_category.get(category, []))
+
     def rebuild_id_index(self) -> None:
         """Rebuild the ID index (call after OPF enrichment populates IDs)."""
         self._by_id = {r.id: r for r in self._items if r.id is not None}
+        self._by_category = None
 
 
 class EpubCore:
@@ -186,7 +203,7 @@ class EpubCore:
 
         container = ContainerDocument.from_xml(self.container_resource.content)
         if len(container.rootfiles) > 1:
-            logger.warning(f"{self} has {len(container.rootfiles)} rootfiles. Using the first one.")
+            logger.warning("%s has %d rootfiles. Using the first one.", self, len(container.rootfiles))
         self._opf_path = container.opf_path
         if self._opf_path is None:
             raise ValueError(f"container.xml does not specify an OPF rootfile.")
@@ -224,7 +241,7 @@ class EpubCore:
             abs_path = self._resolve_href(item.href)
             resource = self.resources.by_path(abs_path)
             if resource is None:
-                logger.warning(f"Manifest item '{item.id}' references missing file: {abs_path}")
+                logger.warning("Manifest item '%s' references missing file: %s", item.id, abs_path)
                 continue
 
             resource.id = item.id
@@ -248,7 +265,7 @@ class EpubCore:
         for idx, itemref in enumerate(self.package.spine.itemrefs):
             resource = self.resources.by_id(itemref.idref)
             if resource is None:
-                logger.warning(f"Spine itemref '{itemref.idref}' references unknown manifest ID.")
+                logger.warning("Spine itemref '%s' references unknown manifest ID.", itemref.idref)
                 continue
             resource.spine_index = idx
             resource.linear = itemref.linear
@@ -259,7 +276,7 @@ class EpubCore:
                 abs_path = self._resolve_href(ref.href)
                 resource = self.resources.by_path(abs_path)
                 if resource is None:
-                    logger.warning(f"Guide reference '{ref.type}' references missing file: {abs_path}")
+                    logger.warning("Guide reference '%s' references missing file: %s", ref.type, abs_path)
                     continue
                 resource.guide_type = ref.type
                 resource.guide_title = ref.title
@@ -364,17 +381,17 @@ class EpubCore:
     @property
     def styles(self) -> list[EPUBResource]:
         """All CSS stylesheets in the EPUB."""
-        return [r for r in self.resources if r.media_type.category == Category.STYLE]
+        return self.resources.by_category(Category.STYLE)
 
     @property
     def fonts(self) -> list[EPUBResource]:
         """All font files in the EPUB."""
-        return [r for r in self.resources if r.media_type.category == Category.FONT]
+        return self.resources.by_category(Category.FONT)
 
     @property
     def images(self) -> list[EPUBResource]:
         """All image files in the EPUB."""
-        return [r for r in self.resources if r.media_type.category == Category.IMAGE]
+        return self.resources.by_category(Category.IMAGE)
 
     @property
     def spine(self) -> list[EPUBResource]:
@@ -475,28 +492,42 @@ class EPUB:
         # If resources are already scanned, use them to find modified content
         resources = self._core.resources if self._core else None
 
+        def loaded(zip_info: ZipInfo) -> bool:
+            """Whether there is a version of the member in memory."""
+            resource = resources.by_path(zip_info.filename) if resources else None
+            return bool(resource and resource.loaded)
+
+        def prepare(zip_info: ZipInfo) -> CompressedMember | None:
+            """Deflates a member in a worker thread, None leaves it to the source to write."""
+            if loaded(zip_info):
+                info = ZipInfo(zip_info.filename, date_time=zip_info_now())
+                return compress_bytes(info, resources.by_path(zip_info.filename).content)
+            return self.source.compress_member(zip_info, ZIP_DEFLATED)
+
         try:
             with self.source.open(), ZipFile(destination, "w", compression=ZIP_DEFLATED) as zipf:
                 mimetype_info = self.source.getinfo("mimetype")
                 self.source.write_to_zipfile(zipf, mimetype_info, compress_type=ZIP_STORED)
 
-                for zip_info in self.source.infolist():
-                    if zip_info.filename in exclude_members:
-                        continue
-                    if zip_info.filename == "mimetype":
-                        continue
-                    if self.skip_dirs and zip_info.is_dir():
-                        continue
-
-                    # Check if we have a version in memory (loaded)
-                    resource = resources.by_path(zip_info.filename) if resources else None
-                    if resource and resource.loaded:
-                        # Write bytes from memory
-                        # TODO make a proper method for this use case
-                        zipf.writestr(zip_info.filename, resource.content)
-                    else:
-                        # Stream untouched bytes from source
-                        self.source.write_to_zipfile(zipf, zip_info)
+                members = [
+                    zip_info
+                    for zip_info in self.source.infolist()
+                    if zip_info.filename not in exclude_members
+                    and zip_info.filename != "mimetype"
+                    and not (self.skip_dirs and zip_info.is_dir())
+                ]
+                # members are deflated concurrently, but written in order from this thread
+                with ExitStack() as stack:
+                    prepared = repeat(None)
+                    if self.source.compresses_members or any(loaded(zip_info) for zip_info in members):
+                        executor = stack.enter_context(ThreadPoolExecutor(max_workers=os.cpu_count()))
+                        prepared = executor.map(prepare, members)
+                    for zip_info, member in zip(members, prepared):
+                        if member is not None:
+                            write_compressed(zipf, member)
+                        else:
+                            # Stream untouched bytes from source
+                            self.source.write_to_zipfile(zipf, zip_info)
 
         except Exception as e:
             logger.error(f"package_into: failed to compress into EPUB: {e}")
@@ -7,9 +7,17 @@ from contextlib import contextmanager
 from enum import Enum
 from pathlib import Path
 from typing import Protocol, Self
-from zipfile import ZipInfo, ZipFile, Path as ZipPath, is_zipfile
-
-from library.epub.zip_utils import zipinfo_to_timestamp
+from zipfile import ZIP_DEFLATED, ZipInfo, ZipFile, Path as ZipPath, is_zipfile
+
+from library.epub.zip_utils import (
+    CompressedMember,
+    compress_file,
+    copy_zipinfo,
+    read_raw,
+    write_compressed,
+    zipinfo_from_stat,
+    zipinfo_to_timestamp,
+)
 from library.utils import ignore_absolute_paths
 
 
@@ -27,6 +35,9 @@ class SourceType(Enum):
 
 
 class SourceProtocol(Protocol):
+    # whether compress_member ever prepares a member, rather than always leaving it to write_to_zipfile
+    compresses_members: bool
+
     def getinfo(self, path: str | Path | ZipPath) -> ZipInfo: ...
     def getpath(self, path: str | Path | ZipPath) -> Path | ZipPath: ...
 
@@ -39,6 +50,7 @@ class SourceProtocol(Protocol):
     def write_to_zipfile(
         self, zip_file: ZipFile, path: str | Path | ZipInfo, compress_type: int | None = None
     ) -> None: ...
+    def compress_member(self, path: str | Path | ZipInfo, compress_type: int) -> CompressedMember | None: ...
 
     @contextmanager
     def open(self) -> Generator[Self, None, None]: ...
@@ -50,6 +62,8 @@ class SourceProtocol(Protocol):
 class DirectorySource:
     """Read-only Directory source"""
 
+    compresses_members = True
+
     def __init__(self, path: str | Path, skip_dirs: bool = False) -> None:
         self.root = Path(path).absolute()
         self.skip_dirs = skip_dirs
@@ -82,18 +96,31 @@ class DirectorySource:
             return path
         return self._to_zipinfo(self._to_relative_path(path))
 
+    def _walk(self) -> Generator[os.DirEntry, None, None]:
+        """Recursive os.scandir walk, entries carry their file type without an extra stat."""
+        stack = [os.fspath(self.root)]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir:
+                        stack.append(entry.path)
+                        if self.skip_dirs:
+                            continue
+                    yield entry
+
+    def _entry_to_zipinfo(self, entry: os.DirEntry) -> ZipInfo:
+        arcname = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+        return zipinfo_from_stat(arcname, entry.stat())
+
     def infolist(self) -> list[ZipInfo]:
-        if self.skip_dirs:
-            return [self.getinfo(file) for file in self.root.rglob("*") if not file.is_dir()]
-        return [self.getinfo(file) for file in self.root.rglob("*")]
+        return [self._entry_to_zipinfo(entry) for entry in self._walk()]
 
     def getpath(self, path: str | Path | ZipPath) -> Path:
         return self._to_absolute_path(path)
 
     def pathlist(self) -> list[Path]:
-        if self.skip_dirs:
-            return [file for file in self.root.rglob("*") if not file.is_dir()]
-        return list(self.root.rglob("*"))
+        return [Path(entry.path) for entry in self._walk()]
 
     def namelist(self) -> list[str]:
         return [info.filename for info in self.infolist()]
@@ -116,6 +143,16 @@ class DirectorySource:
         relative_path = self._to_relative_path(path)
         zip_file.write(filename=absolute_path, arcname=relative_path, compress_type=compress_type)
 
+    def compress_member(self, path: str | Path | ZipInfo, compress_type: int) -> CompressedMember | None:
+        """Deflates a file ahead of writing, safe to call from worker threads. None means write_to_zipfile it."""
+        if compress_type != ZIP_DEFLATED:
+            return None
+        absolute_path = self._to_absolute_path(path)
+        # a ZipInfo from infolist already knows, only bare paths need the stat
+        if path.is_dir() if isinstance(path, ZipInfo) else absolute_path.is_dir():
+            return None
+        return compress_file(absolute_path, self._to_relative_path(path))
+
     def extract(self, destination: str | Path, member: str | ZipInfo) -> str:
         self.log.info(f"{self}.extract({destination}, {member.filename if isinstance(member, ZipInfo) else member})")
         return shutil.copy2(src=self._to_absolute_path(member), dst=destination)
@@ -130,11 +167,14 @@ class DirectorySource:
 
 
 class ZipFileSource:
+    compresses_members = False
+
     def __init__(self, path: str | Path, skip_dirs: bool = False) -> None:
         self.root = Path(path).absolute()
         self.skip_dirs = skip_dirs
         self.log = logging.getLogger(self.__repr__())
         self.zip_file: ZipFile | None = None
+        self._infos: dict[str, ZipInfo] | None = None
         if not is_zipfile(path):
             raise ValueError("Path is not a ZipFile")
 
@@ -146,13 +186,22 @@ class ZipFileSource:
             self.log.error("This operation requires source to be open.")
             raise IOError("This operation requires source to be open.")
 
+    def _central_directory(self) -> dict[str, ZipInfo]:
+        """Members by name, read once per source so listings don't reopen the archive."""
+        if self._infos is None:
+            with self.open():
+                self._infos = {info.filename: info for info in self.zip_file.infolist()}
+        return self._infos
+
     def getinfo(self, path: str | ZipPath | ZipInfo) -> ZipInfo:
         if isinstance(path, ZipInfo):
             return path
         if isinstance(path, ZipPath):
             path = path.at
-        with self.open():
-            return self.zip_file.getinfo(str(path))
+        try:
+            return self._central_directory()[str(path)]
+        except KeyError:
+            raise KeyError(f"There is no item named {str(path)!r} in the archive")
 
     def getpath(self, path: str | ZipPath | ZipInfo) -> ZipPath:
         self._should_be_open()
@@ -160,10 +209,10 @@ class ZipFileSource:
         return ZipPath(root=self.zip_file, at=info.filename)
 
     def infolist(self) -> list[ZipInfo]:
-        with self.open():
-            if self.skip_dirs:
-                return [info for info in self.zip_file.infolist() if not info.is_dir()]
-            return self.zip_file.infolist()
+        infos = self._central_directory().values()
+        if self.skip_dirs:
+            return [info for info in infos if not info.is_dir()]
+        return list(infos)
 
     def pathlist(self) -> list[ZipPath]:
         self._should_be_open()
@@ -171,10 +220,7 @@ class ZipFileSource:
         return [self.getpath(info) for info in self.infolist()]
 
     def namelist(self) -> list[str]:
-        with self.open():
-            if self.skip_dirs:
-                return [info.filename for info in self.infolist()]
-            return self.zip_file.namelist()
+        return [info.filename for info in self.infolist()]
 
     def read_bytes(self, path: str | ZipInfo | ZipPath) -> bytes:
         self.log.warning(f"reading the {path} bytes")
@@ -202,6 +248,10 @@ class ZipFileSource:
         else:
             yield self
 
+    def compress_member(self, path: str | Path | ZipInfo, compress_type: int) -> CompressedMember | None:
+        """Members are copied from the open archive by write_to_zipfile, nothing to prepare."""
+        return None
+
     def write_to_zipfile(self, zip_file: ZipFile, path: str | Path | ZipInfo, compress_type: int | None = None) -> None:
         zip_info = self.getinfo(path)
         if not zip_file.fp:
@@ -210,12 +260,22 @@ class ZipFileSource:
             raise ValueError("Can't write to ZIP archive while an open writing handle exists")
 
         if zip_info.is_dir():
+            zip_info = copy_zipinfo(zip_info)
             zip_info.compress_size = 0
             zip_info.CRC = 0
             zip_file.mkdir(zip_info)
         else:
+            compress_type = compress_type if compress_type is not None else zip_file.compression
+            if zip_info.compress_type == compress_type and not zip_info.flag_bits & 0x1:
+                # already compressed the requested way, copy the stored bytes through
+                with self.open():
+                    member = CompressedMember(copy_zipinfo(zip_info), read_raw(self.zip_file, zip_info))
+                write_compressed(zip_file, member)
+                return
             data_bytes = self.read_bytes(zip_info)
-            zip_info.compress_type = compress_type if compress_type is not None else zip_file.compression
+            # members are cached across opens, write through a copy of the header
+            zip_info = copy_zipinfo(zip_info)
+            zip_info.compress_type = compress_type
             zip_info.compress_level = zip_file.compresslevel
 
             with zip_file.open(zip_info, "w") as dest:
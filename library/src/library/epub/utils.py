@@ -15,6 +15,9 @@ from typing import cast, overload
 
 import bs4
 
+SLUG_UNSAFE_RE = re.compile(r"[^\w\s-]")
+SLUG_SEPARATOR_RE = re.compile(r"[-\s]+")
+
 
 def normalize_path[T: (str, Path, str | Path)](path: T) -> T:
     """
@@ -218,8 +221,8 @@ def slugify(value: str) -> str:
         The slugified value.
     """
     value = unicodedata.normalize("NFKC", value)
-    value = re.sub(r"[^\w\s-]", "", value.lower())
-    return re.sub(r"[-\s]+", "-", value).strip("-_")
+    value = SLUG_UNSAFE_RE.sub("", value.lower())
+    return SLUG_SEPARATOR_RE.sub("-", value).strip("-_")
 
 
 class ResolutionType(enum.Enum):
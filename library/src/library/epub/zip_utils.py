@@ -1,9 +1,42 @@
+import os
+import stat
+import struct
 import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from zipfile import ZipInfo
+from zipfile import ZIP64_LIMIT, ZIP_DEFLATED, ZIP_STORED, BadZipFile, LargeZipFile, ZipFile, ZipInfo
 
 from library.epub.utils import strip_fragment
+from library.utils import scan_files
+
+try:
+    # zlib-ng produces the same raw DEFLATE streams, considerably faster
+    from zlib_ng import zlib_ng as zlib
+except ImportError:
+    import zlib
+
+try:
+    # libdeflate bindings: one shot compression of whole buffers, faster and tighter than zlib
+    import deflate as libdeflate
+except ImportError:
+    libdeflate = None
+
+EPUB_MIMETYPE = b"application/epub+zip"
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+# ZipFile internals write_compressed relies on, checked so a CPython change fails loudly
+ZIPFILE_WRITE_ATTRIBUTES = ("_writing", "_allowZip64", "_seekable", "start_dir", "_writecheck", "_didModify")
+
+
+@dataclass(slots=True)
+class CompressedMember:
+    """Archive member whose data is already compressed with info.compress_type."""
+
+    info: ZipInfo
+    data: bytes
 
 
 def zip_info_now() -> tuple[int, int, int, int, int, int]:
@@ -21,3 +54,231 @@ def info_to_zipinfo(info: ZipInfo | str | Path) -> ZipInfo:
     if isinstance(info, ZipInfo):
         return info
     return ZipInfo(filename=str(strip_fragment(info)), date_time=zip_info_now())
+
+
+def zipinfo_from_stat(arcname: str, st: os.stat_result) -> ZipInfo:
+    """Same as ZipInfo.from_file(strict_timestamps=False), for an already known stat result."""
+    is_dir = stat.S_ISDIR(st.st_mode)
+    date_time = time.localtime(st.st_mtime)[0:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    elif date_time[0] > 2107:
+        date_time = (2107, 12, 31, 23, 59, 59)
+    if is_dir and not arcname.endswith("/"):
+        arcname += "/"
+    zinfo = ZipInfo(arcname, date_time)
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    if is_dir:
+        zinfo.file_size = 0
+        zinfo.external_attr |= 0x10
+    else:
+        zinfo.file_size = st.st_size
+    return zinfo
+
+
+def deflate(data: bytes, compresslevel: int = 6) -> bytes:
+    """Raw DEFLATE stream (no zlib header), as stored in zip archives."""
+    if libdeflate is not None:
+        return bytes(libdeflate.deflate_compress(data, compresslevel))  # the binding returns a bytearray
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_file(path: Path, arcname: str, compresslevel: int = 6) -> CompressedMember:
+    """
+    Reads and deflates a file outside of any ZipFile.
+    zlib, zlib-ng and the libdeflate bindings all release the GIL while compressing,
+    so this can run in worker threads.
+    """
+    info = ZipInfo.from_file(path, arcname=arcname, strict_timestamps=False)
+    return compress_bytes(info, path.read_bytes(), compresslevel)
+
+
+def compress_bytes(info: ZipInfo, data: bytes, compresslevel: int = 6) -> CompressedMember:
+    """
+    Deflates data for the member described by info, filling in its sizes and CRC.
+    Data that deflate does not shrink (images, fonts) is stored as is.
+    """
+    compressed = deflate(data, compresslevel)
+    info.compress_type = ZIP_DEFLATED
+    if len(compressed) >= len(data):
+        compressed = data
+        info.compress_type = ZIP_STORED
+    info.CRC = zlib.crc32(data)
+    info.file_size = len(data)
+    info.compress_size = len(compressed)
+    return CompressedMember(info, compressed)
+
+
+def compress_if_changed(path: Path, info: ZipInfo, compresslevel: int = 6) -> CompressedMember | None:
+    """Deflates path for the member described by info, None if its content is the same as the member's."""
+    data = path.read_bytes()
+    if len(data) == info.file_size and zlib.crc32(data) == info.CRC:
+        return None
+    zinfo = ZipInfo.from_file(path, arcname=info.filename, strict_timestamps=False)
+    return compress_bytes(zinfo, data, compresslevel)
+
+
+def read_raw(zip_file: ZipFile, info: ZipInfo) -> bytes:
+    """Member data exactly as stored in the archive, without decompressing it.
+
+    Parses the member's local header itself, its name and extra field lengths
+    can differ from the central directory's.
+    """
+    zip_file.fp.seek(info.header_offset)
+    header = zip_file.fp.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size:
+        raise BadZipFile(f"Truncated local header for {info.filename}")
+    fields = LOCAL_HEADER.unpack(header)
+    if fields[0] != LOCAL_HEADER_SIGNATURE:
+        raise BadZipFile(f"Bad magic number for file header of {info.filename}")
+    name_length, extra_length = fields[-2:]
+    zip_file.fp.seek(name_length + extra_length, os.SEEK_CUR)
+    data = zip_file.fp.read(info.compress_size)
+    if len(data) != info.compress_size:
+        raise BadZipFile(f"Truncated data for {info.filename}")
+    return data
+
+
+def copy_zipinfo(info: ZipInfo) -> ZipInfo:
+    """Copies a member's header for another archive, dropping its zip64 extra record."""
+    zinfo = ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.comment = info.comment
+    zinfo.create_system = info.create_system
+    zinfo.internal_attr = info.internal_attr
+    zinfo.external_attr = info.external_attr
+    zinfo.CRC = info.CRC
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = info.compress_size
+    extra, position = b"", 0
+    while position + 4 <= len(info.extra):
+        header_id, size = struct.unpack("<HH", info.extra[position : position + 4])
+        if header_id != 0x0001:
+            extra += info.extra[position : position + 4 + size]
+        position += 4 + size
+    zinfo.extra = extra
+    return zinfo
+
+
+def write_compressed(zip_file: ZipFile, member: CompressedMember) -> ZipInfo:
+    """Writes an already compressed member into a ZipFile opened for writing.
+
+    Follows ZipFile._open_to_write and _ZipWriteFile.close, except CRC and sizes
+    are known up front, so the local header is written once with final values.
+    """
+    missing = [name for name in ZIPFILE_WRITE_ATTRIBUTES if not hasattr(zip_file, name)]
+    if missing:
+        raise RuntimeError(f"write_compressed: ZipFile has no {', '.join(missing)}, this Python is not supported")
+    zinfo = member.info
+    if zip_file._writing:
+        raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+
+    zinfo.flag_bits = 0x00
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+    zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+    if zip64 and not zip_file._allowZip64:
+        raise LargeZipFile("Filesize would require ZIP64 extensions")
+
+    if zip_file._seekable:
+        zip_file.fp.seek(zip_file.start_dir)
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    zip_file.fp.write(member.data)
+    zip_file.start_dir = zip_file.fp.tell()
+
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+    return zinfo
+
+
+def pack_epub_directory(
+    directory: Path,
+    destination: Path,
+    workers: int | None = None,
+    compresslevel: int = 6,
+    executor: Executor | None = None,
+) -> None:
+    """Packs an unpacked epub directory into destination.
+
+    mimetype goes first and stored, as the epub container spec requires,
+    every other file is deflated in worker threads and written in sorted order.
+    Pass an executor to reuse one pool across many epubs, a process pool works too.
+    """
+    has_mimetype = False
+    members: dict[str, Path] = {}
+    for entry in scan_files(directory):
+        arcname = os.path.relpath(entry.path, directory).replace(os.sep, "/")
+        if arcname == "mimetype":
+            has_mimetype = True
+        else:
+            members[arcname] = Path(entry.path)
+    if not has_mimetype:
+        raise FileNotFoundError("Missing required 'mimetype' file for EPUB.")
+    arcnames = sorted(members)
+    files = [members[arcname] for arcname in arcnames]
+
+    with ZipFile(destination, "w") as zip_file, ExitStack() as stack:
+        # the content is fixed by the spec, no need to read it back from disk
+        zip_file.writestr("mimetype", EPUB_MIMETYPE, compress_type=ZIP_STORED)
+        if executor is None:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers or os.cpu_count()))
+        for member in executor.map(compress_file, files, arcnames, [compresslevel] * len(files)):
+            write_compressed(zip_file, member)
+
+
+def repack_epub(
+    source: Path,
+    directory: Path,
+    destination: Path,
+    extracted: tuple[str, ...],
+    workers: int | None = None,
+    compresslevel: int = 6,
+    executor: Executor | None = None,
+) -> None:
+    """Packs a partially extracted epub into destination.
+
+    Only the members under the extracted prefixes were unpacked into directory.
+    Those that changed on disk are deflated again, those deleted there are dropped,
+    every other member is copied from source as stored, without recompressing it.
+    Files that were added to directory are appended in sorted order.
+    """
+    on_disk: dict[str, Path] = {}
+    for entry in scan_files(directory):
+        on_disk[os.path.relpath(entry.path, directory).replace(os.sep, "/")] = Path(entry.path)
+
+    with ZipFile(source) as source_zip:
+        # members are copied as stored, an encrypted one would need its password to be rewritten
+        encrypted = [info.filename for info in source_zip.infolist() if info.flag_bits & 0x1]
+        if encrypted:
+            raise ValueError(f"repack_epub: {source.name} has encrypted members {encrypted[:10]}")
+        try:
+            with ZipFile(destination, "w") as zip_file, ExitStack() as stack:
+                if executor is None:
+                    executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers or os.cpu_count()))
+                members = []
+                for info in source_zip.infolist():
+                    if info.filename == "mimetype":
+                        continue
+                    path = on_disk.pop(info.filename, None)
+                    if path is not None:
+                        members.append((info, executor.submit(compress_if_changed, path, info, compresslevel)))
+                    elif not info.filename.startswith(extracted):
+                        members.append((info, None))
+                for arcname in sorted(on_disk):
+                    members.append((None, executor.submit(compress_file, on_disk[arcname], arcname, compresslevel)))
+
+                zip_file.writestr("mimetype", EPUB_MIMETYPE, compress_type=ZIP_STORED)
+                for info, future in members:
+                    member = future.result() if future is not None else None
+                    if member is None:
+                        member = CompressedMember(copy_zipinfo(info), read_raw(source_zip, info))
+                    write_compressed(zip_file, member)
+        except BaseException:
+            # a partly written archive would look like a finished one
+            destination.unlink(missing_ok=True)
+            raise
@@ -27,7 +27,7 @@ def parse_mime_types(path: Path | str) -> dict[str, str]:
             continue
         parts = strip_line.split()
         if len(parts) < 2:
-            logger.warning(f"failed to parse line '{strip_line}'")
+            logger.warning("failed to parse line '%s'", strip_line)
             continue
 
         mimetype = parts[0]
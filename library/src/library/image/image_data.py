@@ -1,3 +1,6 @@
+import io
+import os
+
 from PIL import Image
 from pathlib import Path
 from dataclasses import dataclass
@@ -7,7 +10,7 @@ class ImageProcessorError(Exception):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class ImageData:
     path: Path
 
@@ -21,7 +24,10 @@ class ImageData:
     @property
     def size(self) -> int:
         if not self._size:
-            self._size = self.path.stat().st_size if self.path.exists() else 0
+            try:
+                self._size = self.path.stat().st_size
+            except FileNotFoundError:
+                self._size = 0
         return self._size
 
     @property
@@ -55,9 +61,9 @@ class ImageData:
 
     @property
     def image(self) -> Image.Image:
-        if not self.path.exists():
-            raise FileNotFoundError(f"ImageData.image: image {self.path} does not exist")
         if not self._image:
+            if not self.path.exists():
+                raise FileNotFoundError(f"ImageData.image: image {self.path} does not exist")
             try:
                 self._image = Image.open(self.path)
             except Exception as e:
@@ -75,10 +81,31 @@ class ImageData:
 
     def synchronize(self) -> None:
         """Synchronize image data with the settings."""
+        if self.image.format == "JPEG" and self.image.size != self.dimensions:
+            # let libjpeg decode at a reduced scale, no smaller than the target size
+            self.image.draft(None, self.dimensions)
         if self.image.mode != self.mode:
             self.image = self.image.convert(self.mode)
         if self.image.size != self.dimensions:
-            self.image = self.image.resize(self.dimensions, Image.Resampling.LANCZOS)
+            self.image = self.image.resize(self.dimensions, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    def encode(self, quality: int = 80) -> bytes:
+        """Optimize image and encode it in memory,
+        in the format of the path suffix."""
+
+        self.synchronize()
+
+        buffer = io.BytesIO()
+        image_format = Image.registered_extensions()[self.path.suffix.lower()]
+        if image_format == "PNG":
+            self.image.save(buffer, format=image_format, optimize=True)
+        else:
+            self.image.save(buffer, format=image_format, optimize=True, quality=quality)
+        self.collect_garbage()
+
+        data = buffer.getvalue()
+        self._size = len(data)
+        return data
 
     def optimize_and_save(self, quality: int = 80) -> None:
         """Optimize image and save to path,
@@ -86,14 +113,15 @@ class ImageData:
         resizing if necessary,
         and saving in the correct format."""
 
-        self.synchronize()
+        self.write(self.encode(quality))
 
-        if self.path.suffix.lower() == ".png":
-            self.image.save(self.path, optimize=True)
-        else:
-            self.image.save(self.path, optimize=True, quality=quality)
-        self._size = self.path.stat().st_size
-        self.collect_garbage()
+    def write(self, data: bytes) -> None:
+        """Writes encoded image bytes to path."""
+        # encoded in memory, then swapped in with a single rename
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, self.path)
+        self._size = len(data)
 
     def delete_file_if_size_is_same(self) -> bool:
         self.collect_garbage()
@@ -17,12 +17,13 @@ class ImageFilter:
 
     def __call__(self, imaged: ImageData) -> bool:
         """Returns True if image is eligible for processing, False otherwise."""
+        # suffix first, it needs no stat
+        if self.suffixes and imaged.suffix.lower() not in self.suffixes:
+            return False
         if self.size_lower_threshold and imaged.size < self.size_lower_threshold:
             return False
         if self.size_upper_threshold and imaged.size > self.size_upper_threshold:
             return False
-        if self.suffixes and imaged.suffix.lower() not in self.suffixes:
-            return False
         return True
 
 
@@ -38,7 +39,7 @@ class ImageConverter:
     max_width: int = 1080
     max_height: int = 0
     convert_rgb_to_jpg: bool = True
-    quality: int | None = None
+    quality: int = 80
 
     def new_dimensions(self, imaged: ImageData) -> tuple[int, int]:
         width, height = imaged.dimensions
@@ -55,9 +56,9 @@ class ImageConverter:
 
     def new_mode(self, imaged: ImageData) -> str:
         if imaged.mode == "RGBA":
-            extrema = imaged.image.getextrema()  # LOADS PIXEL DATA
-            no_transparency = len(extrema) == 4 and extrema[3][0] == 255
-            new_mode = "RGB" if no_transparency else "RGBA"
+            # LOADS PIXEL DATA, but only the alpha band is scanned
+            alpha_min, _ = imaged.image.getchannel("A").getextrema()
+            new_mode = "RGB" if alpha_min == 255 else "RGBA"
         else:
             new_mode = imaged.mode
         return new_mode
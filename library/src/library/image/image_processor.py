@@ -2,12 +2,14 @@ import logging
 import time
 
 from dataclasses import dataclass
+from pathlib import Path
 from library.image.image_data import ImageData
+from library.image.image_optimization_settings import ImageSettings
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class ImageProcessingResult:
     ori_image: ImageData
     new_image: ImageData | None = None
@@ -85,23 +87,42 @@ class ImageProcessingResult:
         }
 
 
-# @dataclass
-# class ImageProcessor:
-#     settings: "ImageSettings"
-#
-#     def optimize_image(self, path: Path) -> ImageProcessingResult:
-#         start_time = time.time()
-#         ori_image = ImageData(path)
-#         eligible = self.settings.evaluate(ori_image)
-#         result = ImageProcessingResult(ori_image=ori_image)
-#         if not eligible:
-#             return result.not_eligible_result(start_time)
-#         try:
-#             new_image = self.settings.construct_new_image(ori_image)
-#             new_image.optimize_and_save(self.settings.quality)
-#             ori_image.delete_file_if_size_is_same()
-#             return result.success_result(start_time, new_image)
-#         except Exception as e:
-#             return result.failure_result(start_time, str(e))
+@dataclass
 class ImageProcessor:
-    pass
+    settings: "ImageSettings"
+
+    def optimize_image(self, image: Path | ImageData, save: bool = True) -> ImageProcessingResult:
+        """
+        Optimizes the image at path, with save=False only the size of the result is measured.
+        An ImageData whose size is already known spares the stat.
+        """
+        start_time = time.time()
+        ori_image = image if isinstance(image, ImageData) else ImageData(image)
+        result = ImageProcessingResult(ori_image=ori_image)
+        if not self.settings.filter(ori_image):
+            return result.not_eligible_result(start_time)
+        try:
+            new_image = self.settings.construct_new_image(ori_image)
+            data = new_image.encode(self.settings.converter.quality)
+            if new_image.size >= ori_image.size and new_image.dimensions == ori_image.dimensions:
+                # re-encoding did not pay off, the original stays as it is
+                ori_image.collect_garbage()
+                new_image = ImageData(
+                    ori_image.path,
+                    _size=ori_image.size,
+                    _dimensions=ori_image.dimensions,
+                    _mode=ori_image.mode,
+                )
+                return result.success_result(start_time, new_image)
+            if not save:
+                # the decoded image is shared with new_image, don't send its pixels back to the caller
+                ori_image.collect_garbage()
+                return result.success_result(start_time, new_image)
+            new_image.write(data)
+            ori_image.collect_garbage()
+            if new_image.path != ori_image.path:
+                # converted to another format, the original file is replaced by the new one
+                ori_image.path.unlink(missing_ok=True)
+            return result.success_result(start_time, new_image)
+        except Exception as e:
+            return result.failure_result(start_time, str(e))
@@ -1,8 +1,10 @@
 import fnmatch
+import os
+import re
 import string
 
 from collections import Counter
-from collections.abc import Callable
+from collections.abc import Callable, Generator, Iterable
 from pathlib import Path
 
 
@@ -46,3 +48,43 @@ def ignore_absolute_paths(absolute_paths: list[Path]) -> Callable[[str, list[str
         return set(ignored_names)
 
     return _ignore_patterns
+
+
+def scan_files(
+    root: str | Path,
+    pattern: str = "*",
+    recursive: bool = True,
+    exclude: Iterable[str | Path] = (),
+    skip_hidden: bool = False,
+    ignore_case: bool = False,
+) -> Generator[os.DirEntry, None, None]:
+    """Walks a directory with os.scandir, yielding entries of files matching the pattern.
+
+    DirEntry objects cache is_dir() and stat() results, so callers can read
+    file sizes and timestamps without issuing another syscall per path.
+
+    Args:
+        root: directory to walk.
+        pattern: fnmatch-style pattern matched against file names.
+        recursive: descend into subdirectories.
+        exclude: directories that are not descended into.
+        skip_hidden: do not descend into directories starting with a dot.
+        ignore_case: match the pattern case-insensitively on every platform.
+    """
+    if ignore_case:
+        match = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+    else:
+        match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+    excluded = {os.path.normcase(os.path.abspath(path)) for path in exclude}
+    stack = [os.fspath(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not recursive or (skip_hidden and entry.name.startswith(".")):
+                        continue
+                    if excluded and os.path.normcase(os.path.abspath(entry.path)) in excluded:
+                        continue
+                    stack.append(entry.path)
+                elif match(entry.name if ignore_case else os.path.normcase(entry.name)):
+                    yield entry
@@ -1,5 +1,6 @@
 import re
 import logging
+import threading
 from pathlib import Path
 from typing import Literal, overload, Any
 from collections import Counter
@@ -7,6 +8,11 @@ from lxml import etree
 
 logger = logging.getLogger(__name__)
 
+INVALID_AMPERSAND_RE = re.compile(r"&(?!amp;|lt;|gt;|quot;|apos;|#x?|#)")
+PACKAGE_TAG_RE = re.compile(r"(<package[^>]+)>")
+
+_parsers = threading.local()
+
 
 @overload
 def prettify(document: bytes, encoding: Literal["unicode"]) -> str: ...
@@ -25,17 +31,25 @@ def prettify(document: bytes, encoding: Literal["unicode"] | None = None) -> byt
 def fix_invalid_ampersands(content: str) -> str:
     """Fixes raw ampersands that are not part of a valid XML entity."""
     logger.warning("Invalid ampersands in xml")
-    return re.sub(r"&(?!amp;|lt;|gt;|quot;|apos;|#x?|#)", "&amp;", content)
+    return INVALID_AMPERSAND_RE.sub("&amp;", content)
 
 
 def fix_opf_namespace(content: str) -> str:
     """Add opf namespace to the package tag"""
     logger.warning("Lacking OPF namespace definition in xml")
-    return re.sub(r"(<package[^>]+)>", r'\1 xmlns:opf="http://www.idpf.org/2007/opf">', content, count=1)
+    return PACKAGE_TAG_RE.sub(r'\1 xmlns:opf="http://www.idpf.org/2007/opf">', content, count=1)
+
+
+def cleaning_parser() -> etree.XMLParser:
+    """Parser that drops blank text and comments, one per thread since lxml parsers are not thread safe."""
+    parser = getattr(_parsers, "cleaning", None)
+    if parser is None:
+        parser = _parsers.cleaning = etree.XMLParser(remove_blank_text=True, remove_comments=True)
+    return parser
 
 
 def etree_from_bytes(xml_bytes: bytes) -> etree._Element:
-    parser = etree.XMLParser(remove_blank_text=True, remove_comments=True)
+    parser = cleaning_parser()
     for _ in range(3):
         try:
             return etree.fromstring(xml_bytes, parser)
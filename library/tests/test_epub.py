@@ -1,9 +1,12 @@
 from datetime import datetime
 from pathlib import Path
 
+from zipfile import ZipInfo
+
 import pytest
 
-from library.epub.epub import EPUB
+from library.epub.epub import EPUB, EPUBResource, ResourceIndex
+from library.epub.media_type import Category
 
 ARCHIVE = "C:/Users/Ivan/Projects/ewa/library/tests/samples/source/archive.zip"
 DIRECTORY = "C:/Users/Ivan/Projects/ewa/library/tests/samples/source/directory"
@@ -92,3 +95,15 @@ def test_directory_packaging(destination):
             assert info1.is_dir() == info2.is_dir()
             assert info1.CRC == info2.CRC
             assert source1.read_bytes(info1) == source2.read_bytes(info2)
+
+
+def test_resource_index_by_category():
+    names = ["EPUB/images/a.jpg", "EPUB/images/b.png", "EPUB/style.css", "EPUB/chapter.xhtml"]
+    index = ResourceIndex([EPUBResource(ZipInfo(name), lambda info: b"") for name in names])
+
+    assert [r.filename for r in index.by_category(Category.IMAGE)] == names[:2]
+    assert [r.filename for r in index.by_category(Category.STYLE)] == names[2:3]
+    assert index.by_category(Category.FONT) == []
+
+    index.remove(index.by_path("EPUB/images/a.jpg"))
+    assert [r.filename for r in index.by_category(Category.IMAGE)] == names[1:2]
@@ -0,0 +1,38 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from library.utils import scan_files
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    (tmp_path / "sub" / "deeper").mkdir(parents=True)
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / "excluded").mkdir()
+    (tmp_path / "a.epub").write_bytes(b"")
+    (tmp_path / "B.EPUB").write_bytes(b"")
+    (tmp_path / "notes.txt").write_bytes(b"")
+    (tmp_path / "sub" / "c.epub").write_bytes(b"")
+    (tmp_path / "sub" / "deeper" / "d.epub").write_bytes(b"")
+    (tmp_path / ".hidden" / "e.epub").write_bytes(b"")
+    (tmp_path / "excluded" / "f.epub").write_bytes(b"")
+    return tmp_path
+
+
+def names(entries) -> set[str]:
+    return {entry.name for entry in entries}
+
+
+def test_scan_files(tree: Path):
+    # without ignore_case, B.EPUB only matches where the platform folds case (Windows)
+    upper = {"B.EPUB"} if os.path.normcase("B") == "b" else set()
+    assert names(scan_files(tree, "*.epub")) == {"a.epub", "c.epub", "d.epub", "e.epub", "f.epub"} | upper
+    assert names(scan_files(tree, "*.epub", recursive=False)) == {"a.epub"} | upper
+    assert names(scan_files(tree, recursive=False)) == {"a.epub", "B.EPUB", "notes.txt"}
+
+
+def test_scan_files_filters(tree: Path):
+    entries = scan_files(tree, "*.epub", exclude=[tree / "excluded"], skip_hidden=True, ignore_case=True)
+    assert names(entries) == {"a.epub", "B.EPUB", "c.epub", "d.epub"}
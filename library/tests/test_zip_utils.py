@@ -0,0 +1,260 @@
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile, ZipInfo
+
+import pytest
+
+from library.epub import zip_utils
+from library.epub.source import DirectorySource, ZipFileSource
+from library.epub.zip_utils import (
+    compress_bytes,
+    compress_file,
+    pack_epub_directory,
+    read_raw,
+    repack_epub,
+    write_compressed,
+    zipinfo_from_stat,
+)
+
+
+@pytest.fixture
+def directory(tmp_path: Path) -> Path:
+    directory = tmp_path / "directory"
+    (directory / "EPUB" / "images").mkdir(parents=True)
+    (directory / "mimetype").write_bytes(b"application/epub+zip")
+    (directory / "EPUB" / "chapter.xhtml").write_text("<p>text</p>" * 1000, encoding="utf-8")
+    (directory / "EPUB" / "images" / "image.png").write_bytes(os.urandom(10000))
+    (directory / "EPUB" / "empty.css").write_bytes(b"")
+    return directory
+
+
+def test_write_compressed(directory: Path, tmp_path: Path):
+    destination = tmp_path / "test.epub"
+    files = sorted(file for file in directory.rglob("*") if file.is_file() and file.name != "mimetype")
+
+    with ZipFile(destination, "w") as zipf:
+        zipf.write(directory / "mimetype", arcname="mimetype", compress_type=ZIP_STORED)
+        for file in files:
+            write_compressed(zipf, compress_file(file, file.relative_to(directory).as_posix()))
+        zipf.writestr("after.txt", b"written after precompressed members")
+
+    with ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist()[0] == "mimetype"
+        for file in files:
+            info = zipf.getinfo(file.relative_to(directory).as_posix())
+            assert info.compress_type == (ZIP_DEFLATED if file.suffix == ".xhtml" else ZIP_STORED)
+            assert zipf.read(info) == file.read_bytes()
+        assert zipf.read("after.txt") == b"written after precompressed members"
+
+
+def test_zipfile_write_attributes(tmp_path: Path):
+    # write_compressed drives these ZipFile internals, fail here rather than write corrupt archives
+    with ZipFile(tmp_path / "test.zip", "w") as zipf:
+        for name in zip_utils.ZIPFILE_WRITE_ATTRIBUTES:
+            assert hasattr(zipf, name), name
+
+
+def test_read_raw(tmp_path: Path):
+    destination = tmp_path / "test.zip"
+    text = b"<p>text</p>" * 1000
+    with ZipFile(destination, "w") as zipf:
+        zipf.writestr("stored.txt", text, compress_type=ZIP_STORED)
+        zipf.writestr("deflated.txt", text, compress_type=ZIP_DEFLATED)
+
+    with ZipFile(destination) as zipf:
+        assert read_raw(zipf, zipf.getinfo("stored.txt")) == text
+        info = zipf.getinfo("deflated.txt")
+        raw = read_raw(zipf, info)
+        assert len(raw) == info.compress_size
+        assert zlib.decompress(raw, -15) == text
+
+    data = bytearray(destination.read_bytes())
+    data[0:4] = b"XXXX"
+    destination.write_bytes(data)
+    with ZipFile(destination) as zipf, pytest.raises(BadZipFile):
+        read_raw(zipf, zipf.getinfo("stored.txt"))
+
+
+def test_zipinfo_from_stat(directory: Path):
+    for path in directory.rglob("*"):
+        arcname = path.relative_to(directory).as_posix()
+        expected = ZipInfo.from_file(path, arcname, strict_timestamps=False)
+        info = zipinfo_from_stat(arcname, path.stat())
+        assert info.filename == expected.filename
+        assert info.date_time == expected.date_time
+        assert info.file_size == expected.file_size
+        assert info.external_attr == expected.external_attr
+
+
+def test_write_to_zipfile_copies_raw_members(directory: Path, tmp_path: Path):
+    source_path = tmp_path / "source.epub"
+    with ZipFile(source_path, "w", compression=ZIP_DEFLATED) as zipf:
+        zipf.write(directory / "mimetype", arcname="mimetype", compress_type=ZIP_STORED)
+        for file in sorted(directory.rglob("*")):
+            if file.is_file() and file.name != "mimetype":
+                zipf.write(file, arcname=file.relative_to(directory).as_posix())
+
+    destination = tmp_path / "destination.epub"
+    source = ZipFileSource(source_path)
+    with source.open(), ZipFile(destination, "w", compression=ZIP_DEFLATED) as zipf:
+        source.write_to_zipfile(zipf, "mimetype", compress_type=ZIP_STORED)
+        for info in source.infolist():
+            if info.filename != "mimetype":
+                source.write_to_zipfile(zipf, info)
+
+    with ZipFile(source_path) as original, ZipFile(destination) as copy:
+        assert copy.testzip() is None
+        assert copy.namelist() == original.namelist()
+        for info in original.infolist():
+            copied = copy.getinfo(info.filename)
+            assert copied.compress_type == info.compress_type
+            assert copied.compress_size == info.compress_size
+            assert copy.read(copied) == original.read(info)
+
+
+def test_pack_epub_directory(directory: Path, tmp_path: Path):
+    destination = tmp_path / "packed.epub"
+    pack_epub_directory(directory, destination)
+
+    with ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+        infos = zipf.infolist()
+        assert infos[0].filename == "mimetype"
+        assert infos[0].compress_type == ZIP_STORED
+        assert zipf.namelist().count("mimetype") == 1
+        for info in infos[1:]:
+            assert info.compress_size <= info.file_size
+            assert zipf.read(info) == (directory / info.filename).read_bytes()
+        assert zipf.getinfo("EPUB/chapter.xhtml").compress_type == ZIP_DEFLATED
+        # random bytes don't deflate, they are stored
+        assert zipf.getinfo("EPUB/images/image.png").compress_type == ZIP_STORED
+
+
+def test_pack_epub_directory_in_processes(directory: Path, tmp_path: Path):
+    destination = tmp_path / "packed.epub"
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        pack_epub_directory(directory, destination, executor=executor)
+
+    with ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == ["mimetype", "EPUB/chapter.xhtml", "EPUB/empty.css", "EPUB/images/image.png"]
+        for info in zipf.infolist()[1:]:
+            assert zipf.read(info) == (directory / info.filename).read_bytes()
+
+
+def test_repack_epub(directory: Path, tmp_path: Path):
+    source = tmp_path / "source.epub"
+    pack_epub_directory(directory, source)
+    # images and the chapter are extracted: the image replaced by a new file, the chapter untouched
+    extracted = tmp_path / "extracted"
+    (extracted / "EPUB" / "images").mkdir(parents=True)
+    (extracted / "EPUB" / "images" / "image.jpg").write_bytes(b"jpg" * 100)
+    chapter = extracted / "EPUB" / "chapter.xhtml"
+    chapter.write_bytes((directory / "EPUB" / "chapter.xhtml").read_bytes())
+    os.utime(chapter, (946684800, 946684800))  # 2000-01-01, would show up in a rewritten header
+    destination = tmp_path / "repacked.epub"
+    repack_epub(source, extracted, destination, ("EPUB/images/", "EPUB/chapter.xhtml"))
+
+    with ZipFile(source) as source_zip, ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == ["mimetype", "EPUB/chapter.xhtml", "EPUB/empty.css", "EPUB/images/image.jpg"]
+        assert zipf.infolist()[0].compress_type == ZIP_STORED
+        for name in ("EPUB/chapter.xhtml", "EPUB/empty.css"):
+            # copied as stored, the header keeps the original timestamp
+            assert zipf.getinfo(name).date_time == source_zip.getinfo(name).date_time
+            assert zipf.getinfo(name).compress_size == source_zip.getinfo(name).compress_size
+            assert zipf.read(name) == (directory / name).read_bytes()
+        assert zipf.read("EPUB/images/image.jpg") == b"jpg" * 100
+
+
+def test_repack_epub_rejects_encrypted_members(directory: Path, tmp_path: Path):
+    source = tmp_path / "source.epub"
+    pack_epub_directory(directory, source)
+    # set the encryption bit on the chapter, in its local header and central directory record
+    data = bytearray(source.read_bytes())
+    name = b"EPUB/chapter.xhtml"
+    for signature, flag_offset, name_offset in ((b"PK\x03\x04", 6, 30), (b"PK\x01\x02", 8, 46)):
+        position = data.find(signature)
+        while data[position + name_offset : position + name_offset + len(name)] != name:
+            position = data.find(signature, position + 1)
+        data[position + flag_offset] |= 0x1
+    source.write_bytes(bytes(data))
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+    destination = tmp_path / "repacked.epub"
+
+    with pytest.raises(ValueError, match="encrypted"):
+        repack_epub(source, extracted, destination, ("EPUB/images/",))
+    assert not destination.exists()
+
+
+def test_repack_epub_removes_partial_destination(directory: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    source = tmp_path / "source.epub"
+    pack_epub_directory(directory, source)
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+    destination = tmp_path / "repacked.epub"
+
+    def fail(zip_file: ZipFile, info: ZipInfo) -> bytes:
+        raise OSError("read failed")
+
+    monkeypatch.setattr(zip_utils, "read_raw", fail)
+    with pytest.raises(OSError, match="read failed"):
+        repack_epub(source, extracted, destination, ("EPUB/images/",))
+    assert not destination.exists()
+
+
+def test_pack_epub_directory_requires_mimetype(directory: Path, tmp_path: Path):
+    (directory / "mimetype").unlink()
+    with pytest.raises(FileNotFoundError):
+        pack_epub_directory(directory, tmp_path / "packed.epub")
+
+
+def test_directory_source_compress_member(directory: Path, tmp_path: Path):
+    source = DirectorySource(directory)
+    destination = tmp_path / "destination.epub"
+    with ZipFile(destination, "w", compression=ZIP_DEFLATED) as zipf:
+        source.write_to_zipfile(zipf, "mimetype", compress_type=ZIP_STORED)
+        for info in source.infolist():
+            if info.filename == "mimetype":
+                continue
+            member = source.compress_member(info, ZIP_DEFLATED)
+            if info.is_dir():
+                assert member is None
+                source.write_to_zipfile(zipf, info)
+            else:
+                write_compressed(zipf, member)
+
+    with ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist()[0] == "mimetype"
+        for info in zipf.infolist():
+            if not info.is_dir():
+                assert zipf.read(info) == (directory / info.filename).read_bytes()
+
+
+@pytest.mark.parametrize("backend", ["zlib", "zlib_ng", "libdeflate"])
+def test_deflate_backends(backend: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    import zlib
+
+    monkeypatch.setattr(zip_utils, "libdeflate", None)
+    monkeypatch.setattr(zip_utils, "zlib", zlib)
+    if backend == "zlib_ng":
+        monkeypatch.setattr(zip_utils, "zlib", pytest.importorskip("zlib_ng.zlib_ng"))
+    elif backend == "libdeflate":
+        monkeypatch.setattr(zip_utils, "libdeflate", pytest.importorskip("deflate"))
+
+    data = b"<p>text</p>" * 1000
+    member = compress_bytes(ZipInfo("EPUB/chapter.xhtml"), data)
+    assert type(member.data) is bytes
+    assert member.info.compress_type == ZIP_DEFLATED
+    assert member.info.compress_size < len(data)
+    destination = tmp_path / "destination.zip"
+    with ZipFile(destination, "w") as zipf:
+        write_compressed(zipf, member)
+    with ZipFile(destination) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.read("EPUB/chapter.xhtml") == data
@@ -1,6 +1,6 @@
 import warnings
 import logging
-import os
+import re
 from collections.abc import Callable
 from pathlib import Path
 from typing import Generator
@@ -9,11 +9,22 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup, Tag
 from bs4 import XMLParsedAsHTMLWarning
+from lxml import etree
+from xml.sax.saxutils import escape, unescape
+
+from epub.constants import chapters_arcdir
+from epub.utils import io_workers
 
 warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
 logger = logging.getLogger(__name__)
 
+# <img ... src="...">, groups: everything up to the value, the quote, the value
+# quoted attribute values are skipped whole, they may contain ">" (alt="x > y")
+IMG_SRC_RE = re.compile(
+    rb"""(<(?:[\w-]+:)?img\b(?:[^>"']|"[^"]*"|'[^']*')*?\ssrc\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL
+)
+
 
 class EpubChapter:
     def __init__(self, path: Path):
@@ -57,10 +68,17 @@ class EpubChapter:
     def image_tags(self) -> Generator[Tag, None, None]:
         yield from self.soup.find_all("img")
 
+    def image_sources(self) -> list[str | None]:
+        """src of every img tag, streamed with lxml; the soup is only built for malformed chapters."""
+        try:
+            return [img.get("src") for _, img in etree.iterparse(str(self.path), events=("end",), tag="{*}img")]
+        except etree.XMLSyntaxError:
+            return [img.get("src") for img in self.image_tags()]
+
     def get_linked_image_names(self) -> list[str]:
         list_of_refs = []
-        for img in self.image_tags():
-            src = str(img.get("src"))
+        for src in self.image_sources():
+            src = str(src)
             expected_folder = "../Images/"
             if not src.startswith(expected_folder):
                 self.warnings.append(
@@ -70,25 +88,54 @@ class EpubChapter:
             list_of_refs.append(src.replace(expected_folder, ""))
         return list_of_refs
 
-    def update_image_references(self, replacers: dict[str, str]) -> bool:
+    @staticmethod
+    def _replaced_src(src: str | None, replacers: dict[str, str]) -> str | None:
+        if not src:
+            return None
+        folder, _, img_name = src.rpartition("/")
+        new_name = replacers.get(img_name)
+        if new_name is None:
+            return None
+        return f"{folder}/{new_name}" if folder else new_name
+
+    def _update_bytes(self, content: bytes, replacers: dict[str, str]) -> int:
+        """
+        Rewrites img src attributes in the raw chapter bytes, no tree is built.
+        Everything outside the rewritten values is written back byte for byte,
+        so it works the same for chapters that are not well-formed XML.
+        """
+        updated = 0
+
+        def replace(match: re.Match) -> bytes:
+            nonlocal updated
+            prefix, quote, value = match.groups()
+            src = unescape(value.decode("utf-8", errors="surrogateescape"), {"&quot;": '"', "&apos;": "'"})
+            new_src = self._replaced_src(src, replacers)
+            if new_src is None:
+                return match.group(0)
+            updated += 1
+            new_value = escape(new_src, {quote.decode(): "&quot;" if quote == b'"' else "&apos;"})
+            return prefix + quote + new_value.encode("utf-8", errors="surrogateescape") + quote
+
+        content = IMG_SRC_RE.sub(replace, content)
+        if updated:
+            self.path.write_bytes(content)
+        return updated
+
+    def update_image_references(self, replacers: dict[str, str], candidates: re.Pattern | None = None) -> bool:
+        """candidates matches the raw bytes of any replaced name, chapters without a match are left alone."""
         try:
-            for img in self.image_tags():
-                src = img.get("src")
-                img_name = src.split("/")[-1]
-                if img_name in replacers:
-                    img["src"] = src.replace(img_name, replacers[img_name])
-                    self.references_updated += 1
-
-            if self.references_updated > 0:
-                self.path.write_bytes(self._soup.prettify(encoding="utf-8"))
+            content = self.path.read_bytes()
+            if candidates is not None and not candidates.search(content):
+                self.references_updated = 0
+                return True
+            self.references_updated = self._update_bytes(content, replacers)
             return True
         except Exception as e:
             self.error = f"{self.path.name}: {e}"
             self.references_updated = 0
             logger.error(self.error)
             return False
-        finally:
-            self._soup = None
 
     def to_dict(self) -> dict:
         return {
@@ -101,7 +148,7 @@ class EpubChapter:
 class EpubChapters:
     def __init__(self, unpacked_epub_dir: Path):
         self.unpacked_epub_dir = unpacked_epub_dir
-        self.chapters_dir = unpacked_epub_dir / "EPUB" / "chapters"
+        self.chapters_dir = unpacked_epub_dir / chapters_arcdir
         self.chapters: list[EpubChapter] = list(map(EpubChapter, self.iter_chapter_paths()))
         self.image_references: dict[int, list[str]] | None = None
 
@@ -128,7 +175,7 @@ class EpubChapters:
         if not update and self.image_references is not None:
             return self.image_references
         result = {}
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        with ThreadPoolExecutor(max_workers=io_workers(len(self.chapters))) as executor:
             refs = executor.map(EpubChapter.get_linked_image_names, self.chapters)
         for i, refs in enumerate(refs):
             if refs:
@@ -158,17 +205,24 @@ class EpubChapters:
             List of chapters with orphan images.
             List of images without references.
         """
-        all_refs = [value for sublist in self.map_image_references().values() for value in sublist]
-        if set(all_refs) != set(images):
-            ch_with_orphans = [
-                (i, [ref for ref in refs if ref not in images])
-                for i, refs in self.map_image_references().items()
-                if not all(ref in images for ref in refs)
-            ]
+        references = self.map_image_references()
+        image_set = set(images)
+        all_refs = {value for sublist in references.values() for value in sublist}
+        if all_refs != image_set:
+            ch_with_orphans = []
+            for i, refs in references.items():
+                orphans = [ref for ref in refs if ref not in image_set]
+                if orphans:
+                    ch_with_orphans.append((i, orphans))
             imgs_without_refs = [img for img in images if img not in all_refs]
             return False, ch_with_orphans, imgs_without_refs
         return True, [], []
 
+    def translate(self, table: dict) -> None:
+        """Translates every chapter, reads and writes of different chapters overlap in threads."""
+        with ThreadPoolExecutor(max_workers=io_workers(len(self.chapters))) as executor:
+            list(executor.map(EpubChapter.translate, self.chapters, [table] * len(self.chapters)))
+
     def update_image_references(self, replacers: dict[str, str]) -> bool:
         """
         Update image references in a chapter
@@ -178,20 +232,32 @@ class EpubChapters:
             True if the image references were updated successfully, False otherwise.
         """
         start_time = time.time()
+        if not replacers:
+            self.update_time = time.time() - start_time
+            return True
         chapters_with_images = self.with_images
         list_of_replacers = [replacers] * len(chapters_with_images)
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # names as they may appear in the markup, with and without entity escaping
+        names = {spelling for name in replacers for spelling in (name, escape(name, {'"': "&quot;"}))}
+        candidates = re.compile(b"|".join(re.escape(name.encode()) for name in names))
+        with ThreadPoolExecutor(max_workers=io_workers(len(chapters_with_images))) as executor:
             results = executor.map(
                 EpubChapter.update_image_references,
                 chapters_with_images,
                 list_of_replacers,
+                [candidates] * len(chapters_with_images),
             )
         self.update_time = time.time() - start_time
         return all(results)
 
     def short_report(self) -> dict:
+        # one pass; errors are only ever set on chapters that had references to update
+        updated = errors = 0
+        for chapter in self.chapters:
+            updated += chapter.references_updated > 0
+            errors += chapter.error is not None
         return {
-            "chapters t/u/e": f"{len(self)} / {self.updated} / {len(self.errors)}",
+            "chapters t/u/e": f"{len(self)} / {updated} / {errors}",
             "time": f"{self.update_time:.2f} s",
         }
 
@@ -1,15 +1,25 @@
+from functools import cache
 from pathlib import Path
 
+epub_glob = "*.epub"
+
+# locations inside an unpacked epub, as posix archive paths
+images_arcdir = "EPUB/images"
+chapters_arcdir = "EPUB/chapters"
+
 epub_dir = Path(r"D:\EPUB")
 duplicates_directory = epub_dir / "_duplicates"
-duplicates_directory.mkdir(parents=True, exist_ok=True)
 quarantine_directory = epub_dir / "_quarantine"
-quarantine_directory.mkdir(parents=True, exist_ok=True)
 translated_directory = epub_dir / "_translated"
-translated_directory.mkdir(parents=True, exist_ok=True)
 untranslated_directory = epub_dir / "_untranslated"
-untranslated_directory.mkdir(parents=True, exist_ok=True)
+resized_directory = epub_dir / "_resized"
 
 
 translated_r_directory = epub_dir / "_translated" / "for removal"
-translated_r_directory.mkdir(parents=True, exist_ok=True)
+
+
+@cache
+def ensure_directory(directory: Path) -> Path:
+    """Creates directory on first use instead of at import."""
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
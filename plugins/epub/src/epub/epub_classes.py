@@ -1,3 +1,4 @@
+import os
 import shutil
 import tempfile
 import logging
@@ -5,9 +6,10 @@ import logging
 from queue import Queue
 from pathlib import Path
 from typing import Self
-from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+from zipfile import ZipFile, ZipInfo
 from collections.abc import Iterable, Generator
-from concurrent.futures.thread import ThreadPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from library.database.sqlite_model_table import TERMINATOR
 from ewa.ui import print_error, print_success
@@ -15,9 +17,11 @@ from epub.epub_state import EpubIllustrations
 from epub.tables import EpubFileModel, EpubContentsModel, EpubBookTable, EpubContentsTable
 from epub.utils import string_to_int_hash
 from epub.file_parsing import parse_epub_xml
-from epub.constants import quarantine_directory
+from epub.constants import quarantine_directory, epub_glob, ensure_directory
 
+from library.epub.zip_utils import pack_epub_directory
 from library.image.image_optimization_settings import ImageSettings
+from library.utils import scan_files
 from epub.chapter_processor import EpubChapters
 
 logger = logging.getLogger(__name__)
@@ -34,7 +38,7 @@ class UnpackedEPUB:
 
     @property
     def images(self) -> EpubIllustrations:
-        return EpubIllustrations(self.path / "EPUB" / "images", ImageSettings())
+        return EpubIllustrations(self.path, ImageSettings())
 
     def compress(self, destination_folder: Path) -> EPUB:
         if not destination_folder.exists() or not destination_folder.is_dir():
@@ -47,17 +51,7 @@ class UnpackedEPUB:
             path = path.with_stem(path.stem + "+")
 
         try:
-            with ZipFile(path, "w") as zipf:
-                mimetype_file = self.path / "mimetype"
-                if mimetype_file.exists():
-                    zipf.write(mimetype_file, arcname="mimetype", compress_type=ZIP_STORED)
-                else:
-                    raise FileNotFoundError("Missing required 'mimetype' file for EPUB.")
-
-                for file in self.path.rglob("*"):
-                    if file.is_file() and file.name != "mimetype":
-                        arcname = file.relative_to(self.path)
-                        zipf.write(file, arcname=arcname, compress_type=ZIP_DEFLATED)
+            pack_epub_directory(self.path, path)
             return EPUB(path)
         except Exception as e:
             logger.error(f"temporary_directory: failed to compress directory into EPUB: {e}")
@@ -80,8 +74,7 @@ class UnpackedEPUB:
                 path.unlink()
 
     def translate(self, table: dict) -> Self:
-        for chapter in self.chapters:
-            chapter.translate(table)
+        self.chapters.translate(table)
         self.remove_font()
         return self
 
@@ -96,6 +89,31 @@ class EPUB:
         self.book_id = book_id or string_to_int_hash(str(path))
         self.book_model = book_model
         self.book_contents_models: list[EpubContentsModel] | None = None
+        self.zip_file: ZipFile | None = None
+        self._infolist: list[ZipInfo] | None = None
+
+    @contextmanager
+    def open(self) -> Generator[ZipFile, None, None]:
+        """Opens the archive, nested calls reuse the already open handle."""
+        if self.zip_file is not None:
+            yield self.zip_file
+            return
+        with ZipFile(self.path) as zip_file:
+            self.zip_file = zip_file
+            try:
+                yield zip_file
+            finally:
+                self.zip_file = None
+
+    def infolist(self) -> list[ZipInfo]:
+        """Central directory of the archive, read once per instance."""
+        if self._infolist is None:
+            with self.open() as zip_file:
+                self._infolist = zip_file.infolist()
+        return self._infolist
+
+    def namelist(self) -> list[str]:
+        return [info.filename for info in self.infolist()]
 
     @classmethod
     def from_epub_model(cls, model: EpubFileModel):
@@ -129,12 +147,12 @@ class EPUB:
         self.path_scan()
         if overwrite or self.book_contents_models is None:
             self.book_contents_models = []
-        with ZipFile(self.path) as zip_file:
+        with self.open() as zip_file:
             parsed_data = parse_epub_xml(zipfile=zip_file)
             self.book_model.read_metadata(parsed_data)
             data = parsed_data.get("data", {})
             filenames = []
-            for info in zip_file.infolist():
+            for info in self.infolist():
                 fdata = data.get(info.filename, {})
                 self.book_contents_models.append(EpubContentsModel.from_zip_info(info, self.book_id, fdata))
                 filenames.append(info.filename)
@@ -142,25 +160,24 @@ class EPUB:
             self.book_model.process_filenames(filenames)
 
     def file_identities_dict(self):
-        with ZipFile(self.path) as zip_file:
-            return {info.filename: string_to_int_hash(zip_file.read(info.filename)) for info in zip_file.infolist()}
+        with self.open() as zip_file:
+            return {info.filename: string_to_int_hash(zip_file.read(info)) for info in self.infolist()}
 
     def file_identities_and_sizes_dict(self):
-        with ZipFile(self.path) as zip_file:
+        with self.open() as zip_file:
             return {
-                info.filename: (info.file_size, string_to_int_hash(zip_file.read(info.filename)))
-                for info in zip_file.infolist()
+                info.filename: (info.file_size, string_to_int_hash(zip_file.read(info))) for info in self.infolist()
             }
 
     def extract(self) -> UnpackedEPUB:
         unpacked_directory = Path(tempfile.mkdtemp())
         unpacked_directory.mkdir(parents=True, exist_ok=True)
-        with ZipFile(self.path) as zip_file:
+        with self.open() as zip_file:
             zip_file.extractall(unpacked_directory)
         return UnpackedEPUB(unpacked_directory, self.path.name)
 
     def get_file_bytes(self, filepath: str):
-        with ZipFile(self.path) as zip_file:
+        with self.open() as zip_file:
             return zip_file.read(filepath)
 
     def move_original_to(self, directory: Path, overwrite: bool = True, try_rename: bool = True) -> bool:
@@ -188,63 +205,93 @@ class EPUB:
         return False
 
     def parse_metadata(self):
-        with ZipFile(self.path) as zip_file:
+        with self.open() as zip_file:
             parsed_data = parse_epub_xml(zipfile=zip_file)
         return parsed_data
 
 
+def scan_epub_file(path: Path, stat: os.stat_result | None = None) -> tuple[EpubFileModel | None, list[dict]]:
+    """
+    Reads the book model and its contents rows from an epub file.
+    Unreadable archives are moved to quarantine.
+    Module level function, so it can be submitted to a process pool.
+    """
+    try:
+        book = EpubFileModel.from_path(path, stat)
+        book_id = book.id
+    except Exception as e:
+        logger.error(f"process_epub({path}): failed to load book: {e}")
+        return None, []
+    rows = []
+    try:
+        filenames = []
+        with ZipFile(path) as zip_file:
+            parsed_data = parse_epub_xml(zipfile=zip_file)
+            book.read_metadata(parsed_data)
+            data = parsed_data.get("data", {}).copy()
+
+            for info in zip_file.infolist():
+                fdata = data.pop(info.filename, {})
+                rows.append(EpubContentsModel.dict_from_zip_info(info, book_id, fdata))
+                filenames.append(info.filename)
+
+            for filename, fdata in data.items():
+                rows.append(EpubContentsModel.from_orphaned_dict(filename, book_id, fdata))
+
+        book.process_filenames(filenames)
+    except Exception as e:
+        logger.error(f"process_epub({path}): failed to process zipfile, quarantining: {e}")
+        path.rename(ensure_directory(quarantine_directory) / path.name)
+    return book, rows
+
+
 class ScanEpubsInDirectory:
     def __init__(
         self,
         directory: Path,
-        mask: str = "*.epub",
-        queue: Queue[dict] = Queue(),
+        mask: str = epub_glob,
+        queue: Queue[list[dict]] = Queue(),
         workers: int = 0,
+        processes: bool = False,
     ) -> None:
         self.directory = directory
         self.mask = mask
-        self.paths: Iterable[Path] = (
-            path
-            for path in directory.rglob(mask)
-            if quarantine_directory not in path.parents  # and untranslated_directory not in path.parents
+        self.entries: Iterable[os.DirEntry] = scan_files(
+            directory,
+            mask,
+            exclude=[quarantine_directory],  # untranslated_directory
+            skip_hidden=True,
+            ignore_case=True,
         )
         self.workers = workers
+        self.processes = processes
         self.queue = queue
 
-    def process_epub(self, path: Path) -> EpubFileModel | None:
-        try:
-            book = EpubFileModel.from_path(path)
-            book_id = book.id
-        except Exception as e:
-            logger.error(f"process_epub({path}): failed to load book: {e}")
-            return None
-        try:
-            filenames = []
-            with ZipFile(path) as zip_file:
-                parsed_data = parse_epub_xml(zipfile=zip_file)
-                book.read_metadata(parsed_data)
-                data = parsed_data.get("data", {}).copy()
-
-                for info in zip_file.infolist():
-                    fdata = data.pop(info.filename, {})
-                    self.queue.put(EpubContentsModel.dict_from_zip_info(info, book_id, fdata))
-                    filenames.append(info.filename)
+    def _put_rows(self, book: EpubFileModel | None, rows: list[dict]) -> EpubFileModel | None:
+        if rows:
+            self.queue.put(rows)  # one put per book rather than per row
+        return book
 
-                for filename, fdata in data.items():
-                    self.queue.put(EpubContentsModel.from_orphaned_dict(filename, book_id, fdata))
+    def process_epub(self, entry: os.DirEntry) -> EpubFileModel | None:
+        return self._put_rows(*scan_epub_file(Path(entry.path), entry.stat()))
 
-            book.process_filenames(filenames)
-        except Exception as e:
-            logger.error(f"process_epub({path}): failed to process zipfile, quarantining: {e}")
-            path.rename(quarantine_directory / path.name)
-        return book
+    def _process_in_processes(self) -> Generator[EpubFileModel | None, None, None]:
+        entries = list(self.entries)
+        paths = [Path(entry.path) for entry in entries]
+        stats = [entry.stat() for entry in entries]
+        chunksize = max(1, len(paths) // (self.workers * 4))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for book, rows in executor.map(scan_epub_file, paths, stats, chunksize=chunksize):
+                yield self._put_rows(book, rows)
 
     def _process_paths(self) -> Generator[EpubFileModel, None, None]:
-        if self.workers:
+        if self.workers and self.processes:
+            yield from filter(None, self._process_in_processes())
+        elif self.workers:
             with ThreadPoolExecutor(max_workers=self.workers) as executor:
-                yield from filter(None, executor.map(self.process_epub, self.paths))
+                yield from filter(None, executor.map(self.process_epub, self.entries))
         else:
-            yield from filter(None, map(self.process_epub, self.paths))
+            yield from filter(None, map(self.process_epub, self.entries))
         self.queue.put(TERMINATOR)
 
     def do_scan(self):
@@ -252,8 +299,8 @@ class ScanEpubsInDirectory:
 
     def do_scan_with_progress(self):
         books = []
-        self.paths = list(self.paths)
-        total = len(self.paths)
+        self.entries = list(self.entries)
+        total = len(self.entries)
         current = 0
         print("[green]Scanning...", current, total)
         for book in self._process_paths():
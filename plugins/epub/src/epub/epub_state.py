@@ -6,17 +6,24 @@ import logging
 import time
 import os
 
-from typing import Iterator, Generator
+from contextlib import ExitStack
+from itertools import repeat
+from typing import Iterator, Generator, Self
 from dataclasses import dataclass, field
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+from zipfile import ZipFile, ZipInfo
 
 # import pandas as pd
 
+from library.epub.zip_utils import repack_epub
+from library.image.image_data import ImageData
 from library.image.image_processor import ImageProcessingResult, ImageProcessor
 from library.image.image_optimization_settings import ImageSettings
+from library.utils import scan_files
 from epub.chapter_processor import EpubChapters
+from epub.constants import chapters_arcdir, images_arcdir, resized_directory, ensure_directory
+from epub.utils import bt_to_mb
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +33,8 @@ class ZipMixin:
     ziplike_path: Path
     unpacked_directory: Path | None = None
 
-    def _extract(self, directory: Path | None = None) -> None:
+    def _extract(self, directory: Path | None = None, prefix: str | tuple[str, ...] | None = None) -> None:
+        """Extracts the archive, or only the members under prefix (or any of several prefixes)."""
         if self.ziplike_path is None:
             raise ValueError("ziplike_path is not set")
         if directory is not None:
@@ -36,13 +44,23 @@ class ZipMixin:
         else:
             self.unpacked_directory.mkdir(parents=True, exist_ok=True)
         with ZipFile(self.ziplike_path) as zip_file:
-            zip_file.extractall(self.unpacked_directory)
+            members = None
+            if prefix is not None:
+                members = [info for info in zip_file.infolist() if info.filename.startswith(prefix)]
+            zip_file.extractall(self.unpacked_directory, members)
 
     def _teardown(self) -> None:
         if self.unpacked_directory and self.unpacked_directory.exists():
             shutil.rmtree(self.unpacked_directory)
             self.unpacked_directory = None
 
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Removes the unpacked directory, whatever state the work left it in."""
+        self._teardown()
+
     def iterate(self) -> Iterator[ZipInfo]:
         with ZipFile(self.ziplike_path) as zip_file:
             for info in zip_file.infolist():
@@ -51,9 +69,11 @@ class ZipMixin:
 
 @dataclass
 class UnpackedEpub(ZipMixin):
+    # the only parts of the archive that optimize modifies, everything else is copied over as stored
+    extracted_prefixes = (f"{images_arcdir}/", f"{chapters_arcdir}/")
+
     # Paths
-    output_path: Path | None = None
-    # user_directory: EpubUserDirectory = field(default_factory=EpubUserDirectory)
+    output_path: Path | None = None  # directory for the optimized epub, resized_directory by default
 
     chapters: EpubChapters | None = None
     illustrations: EpubIllustrations | None = None
@@ -69,17 +89,7 @@ class UnpackedEpub(ZipMixin):
         while path.exists():
             path = path.with_stem(path.stem + "+")
         try:
-            with ZipFile(path, "w") as zipf:
-                mimetype_file = self.unpacked_directory / "mimetype"
-                if mimetype_file.exists():
-                    zipf.write(mimetype_file, arcname="mimetype", compress_type=ZIP_STORED)
-                else:
-                    raise FileNotFoundError("Missing required 'mimetype' file for EPUB.")
-
-                for file in self.unpacked_directory.rglob("*"):
-                    if file.is_file() and file.name != "mimetype":
-                        arcname = file.relative_to(self.unpacked_directory)
-                        zipf.write(file, arcname=arcname, compress_type=ZIP_DEFLATED)
+            repack_epub(self.ziplike_path, self.unpacked_directory, path, self.extracted_prefixes)
             return path
         except Exception as e:
             logger.error(f"temporary_directory: failed to compress directory into EPUB: {e}")
@@ -87,16 +97,20 @@ class UnpackedEpub(ZipMixin):
         finally:
             self._teardown()
 
-    def optimize(self, image_settings: ImageSettings) -> OptimizeResult:
+    def optimize(self, image_settings: ImageSettings, executor: ProcessPoolExecutor | None = None) -> OptimizeResult:
         start_time = time.time()
         result = OptimizeResult()
         result.original_epub_path = self.ziplike_path
         result.original_epub_size = self.ziplike_path.stat().st_size
         try:
-            self._extract()
+            self._extract(prefix=self.extracted_prefixes)
             self.chapters = EpubChapters(self.unpacked_directory)
             self.illustrations = EpubIllustrations(self.unpacked_directory, image_settings)
-            result.optimization_results = self.illustrations.optimize_images_in_sync()
+            # chapters are scanned for image references while the worker processes encode images
+            with ThreadPoolExecutor(max_workers=1) as scanner:
+                references = scanner.submit(self.chapters.map_image_references)
+                result.optimization_results = self.illustrations.optimize_images_in_processes(executor)
+                references.result()
             result.optimization_time = self.illustrations.optimization_time
             result.optimization_success = all(op_result.success for op_result in result.optimization_results)
             assert result.optimization_success, "Some images failed to resize"
@@ -104,7 +118,7 @@ class UnpackedEpub(ZipMixin):
             result.chapter_time = self.chapters.update_time
             result.chapter_report = self.chapters.detailed_report()
             assert result.chapter_report, "Failed to update image references"
-            result.resized_epub_path = self._compact_epub(self.user_directory.resized_dir)
+            result.resized_epub_path = self._compact_epub(ensure_directory(self.output_path or resized_directory))
             result.resized_epub_size = result.resized_epub_path.stat().st_size
             result.success = True
         except Exception as e:
@@ -114,15 +128,18 @@ class UnpackedEpub(ZipMixin):
         result.total_time = time.time() - start_time
         return result
 
-    def measure_optimized_size(self, image_settings: ImageSettings) -> OptimizeResult:
+    def measure_optimized_size(
+        self, image_settings: ImageSettings, executor: ProcessPoolExecutor | None = None
+    ) -> OptimizeResult:
         start_time = time.time()
         result = OptimizeResult()
         result.original_epub_path = self.ziplike_path
         result.original_epub_size = self.ziplike_path.stat().st_size
         try:
-            self._extract()
+            # nothing but the images is read when measuring
+            self._extract(prefix=f"{images_arcdir}/")
             self.illustrations = EpubIllustrations(self.unpacked_directory, image_settings)
-            result.optimization_results = self.illustrations.optimize_images_in_sync()
+            result.optimization_results = self.illustrations.optimize_images_in_processes(executor, save=False)
             result.optimization_time = self.illustrations.optimization_time
             result.optimization_success = all(op_result.success for op_result in result.optimization_results)
             result.success = True
@@ -162,13 +179,20 @@ class OptimizeResult:
     resized_epub_size: float = 0
 
     def image_rename_dict(self) -> dict[str, str]:
-        return {img.name: img.new_image.path.name for img in self.optimization_results if img.renamed}
+        renames = {}
+        for img in self.optimization_results:
+            if img.new_image is None:
+                continue
+            old_name, new_name = img.ori_image.path.name, img.new_image.path.name
+            if old_name != new_name:
+                renames[old_name] = new_name
+        return renames
 
     def report_line_success(self) -> dict:
         return {
             "name": self.original_epub_path.name,
             "time": f"{self.total_time:.2f} s",
-            "original_size": f"{self.original_epub_size / 1024 / 1024:.2f} mb",
+            "original_size": bt_to_mb(self.original_epub_size),
             "compressed_to": f"{self.resized_epub_size / self.original_epub_size * 100:.2f}%",
         }
 
@@ -176,21 +200,23 @@ class OptimizeResult:
         return {
             "name": self.original_epub_path.name,
             "time": f"{self.total_time:.2f} s",
-            "original_size": f"{self.original_epub_size / 1024 / 1024:.2f} mb",
+            "original_size": bt_to_mb(self.original_epub_size),
             "error": self.error[:50],
         }
 
     def report_line_resize(self) -> dict:
-        old_image_size = sum(rr["old_size"] for rr in self.optimization_results)
-        new_image_size = sum(rr["new_size"] for rr in self.optimization_results)
-        compression = round(new_image_size / old_image_size * 100, 2)
+        old_image_size = new_image_size = 0
+        for rr in self.optimization_results:
+            old_image_size += rr.ori_image.size
+            new_image_size += rr.new_image.size if rr.new_image else rr.ori_image.size
+        compression = round(new_image_size / old_image_size * 100, 2) if old_image_size else 100
         images = len(self.optimization_results)
         # errors = len([rr for rr in self.resize_report if rr["error"]])
         return {
             "name": self.original_epub_path.name,
             "time": f"{self.total_time:.2f} s",
             "images": images,
-            "old_size": f"{old_image_size / 1024 / 1024:.2f} mb",
+            "old_size": bt_to_mb(old_image_size),
             "compressed_to": f"{compression:.2f}%",
             "success": self.optimization_success,
         }
@@ -206,12 +232,20 @@ class EpubIllustrations:
 
     @property
     def actual_size(self) -> int:
-        return sum(p.stat().st_size for p in self.iter_image_paths())
+        return sum(image.size for image in self.iter_images())
 
     def iter_image_paths(self) -> Generator[Path, None, None]:
-        for path in self.epub_temp_dir.glob("EPUB/images/*.*"):
+        for path in self.epub_temp_dir.glob(f"{images_arcdir}/*.*"):
             yield path
 
+    def iter_images(self) -> Generator[ImageData, None, None]:
+        """Images with their sizes taken from the directory listing, one stat per file."""
+        images_dir = self.epub_temp_dir / images_arcdir
+        if not images_dir.is_dir():
+            return
+        for entry in scan_files(images_dir, "*.*", recursive=False):
+            yield ImageData(Path(entry.path), _size=entry.stat().st_size)
+
     def optimize_images_in_threads(self) -> list[ImageProcessingResult]:
         start_time = time.time()
         processor = ImageProcessor(self.image_settings)
@@ -220,6 +254,35 @@ class EpubIllustrations:
         self.optimization_time = time.time() - start_time
         return results
 
+    def optimize_images_in_processes(
+        self, executor: ProcessPoolExecutor | None = None, save: bool = True
+    ) -> list[ImageProcessingResult]:
+        """
+        Resizes eligible images in worker processes, ineligible ones are settled here without a round trip.
+        Pass an executor to reuse one pool across many epubs.
+        With save=False images are only encoded in memory to measure them, nothing is written back.
+        """
+        start_time = time.time()
+        processor = ImageProcessor(self.image_settings)
+        results: dict[Path, ImageProcessingResult | None] = {}
+        eligible: list[ImageData] = []
+        for image in self.iter_images():
+            results[image.path] = None
+            if self.image_settings.filter(image):
+                eligible.append(image)
+            else:
+                results[image.path] = ImageProcessingResult(ori_image=image).not_eligible_result(start_time)
+        if eligible:
+            # images are sent with their listed sizes, so workers don't stat them again
+            chunksize = max(1, len(eligible) // ((os.cpu_count() or 1) * 4))
+            with ExitStack() as stack:
+                if executor is None:
+                    executor = stack.enter_context(ProcessPoolExecutor(max_workers=os.cpu_count()))
+                optimized = executor.map(processor.optimize_image, eligible, repeat(save), chunksize=chunksize)
+                results.update((image.path, result) for image, result in zip(eligible, optimized))
+        self.optimization_time = time.time() - start_time
+        return list(results.values())
+
     def optimize_images_in_sync(self) -> list[ImageProcessingResult]:
         start_time = time.time()
         processor = ImageProcessor(self.image_settings)
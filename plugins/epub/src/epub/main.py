@@ -1,4 +1,5 @@
 import logging
+import os
 
 import typer
 from pathlib import Path
@@ -10,8 +11,8 @@ from ewa.cli.progress import DisplayProgress
 from ewa.main import settings
 from epub.tables import EpubBookTable, EpubContentsTable
 from epub.epub_classes import EPUB
-from epub.constants import duplicates_directory, epub_dir
-from library.utils import sanitize_filename
+from epub.constants import duplicates_directory, epub_dir, epub_glob, ensure_directory
+from library.utils import sanitize_filename, scan_files
 
 app = typer.Typer(help="Epub Plugin")
 
@@ -33,16 +34,17 @@ def scan_epubs_in_current_directory(path: Path = typer.Argument(None)):
 @app.command()
 def dups(move: bool = typer.Option(False, "-m", "--move"), cleanup: bool = typer.Option(False, "-c", "--cleanup")):
     if cleanup:
-        for i in duplicates_directory.iterdir():
-            if i.is_dir():
-                files = list(i.glob("*.epub"))
-                if len(files) == 1:
-                    print_success(str(i))
-                    EPUB(files[0]).move_original_to(epub_dir, overwrite=False)
-                    files = list(i.glob("*.epub"))
-                if len(files) == 0:
-                    print_success(str(i))
-                    i.rmdir()
+        with os.scandir(ensure_directory(duplicates_directory)) as entries:
+            directories = [Path(entry.path) for entry in entries if entry.is_dir()]
+        for i in directories:
+            files = [Path(entry.path) for entry in scan_files(i, epub_glob, recursive=False)]
+            if len(files) == 1:
+                print_success(str(i))
+                if EPUB(files[0]).move_original_to(epub_dir, overwrite=False):
+                    files = []
+            if len(files) == 0:
+                print_success(str(i))
+                i.rmdir()
         return
     with EpubBookTable() as table:
         title_list = table.get_most_common([table.model.title], table.model.serene_panda == 1, more_then=1)
@@ -110,7 +112,8 @@ def count(
 ):
     if files:
         print_success(f"Counting epub files in {settings.current_dir}...")
-        print_success(f"{len(tuple(Path(settings.current_dir).rglob('*.epub')))} epub files found")
+        found = sum(1 for _ in scan_files(settings.current_dir, epub_glob, ignore_case=True))
+        print_success(f"{found} epub files found")
     if rows:
         with EpubContentsTable() as table:
             print_success(f"Counting epub file records in {table.model.__tablename__} SQL table...")
@@ -1,24 +1,27 @@
+import csv
 import datetime
 import json
 import logging
+import os
+from collections.abc import Callable
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import repeat, combinations
 from pathlib import Path
 from zipfile import ZipFile
 
-import pandas as pd
-
 from epub.epub_classes import EPUB, ScanEpubsInDirectory
 from epub.file_parsing import parse_container_xml, parse_content_opf
 from epub.serene_panda.font import process_font
 from epub.tables import EpubFileModel, EpubBookTable, EpubContentsTable
-from epub.utils import string_to_int_hash64, to_hex_hash
+from epub.utils import io_workers, string_to_int_hash64, to_hex_hash
 from epub.constants import (
     translated_directory,
     translated_r_directory,
     untranslated_directory,
     epub_dir,
     quarantine_directory,
+    epub_glob,
+    ensure_directory,
 )
 from ewa.cli.progress import DisplayProgress, track_unknown, track_sized, track_batch_queue, track_batch_sized
 from ewa.main import settings
@@ -26,9 +29,13 @@ from ewa.ui import print_success, print_error
 from library.database.sqlite_model_table import TERMINATOR
 from library.epub.xml_models.opf_model import Metadata, PackageDocument
 from library.image.ocr import recognize_letter
+from library.utils import scan_files
 
 logger = logging.getLogger(__name__)
 
+# (print_success or print_error, message), printed later by the thread that reports
+Messages = list[tuple[Callable[[str], None], str]]
+
 
 def extract_to_destination(book: EpubFileModel) -> bool:
     try:
@@ -47,8 +54,9 @@ def extract_to_destination(book: EpubFileModel) -> bool:
 def extract_font_files(table: EpubBookTable):
     path = settings.profile_dir / "epub" / "serene_panda" / "fonts"
     path.mkdir(parents=True, exist_ok=True)
-    with ThreadPoolExecutor(max_workers=12) as executor:
-        errs = list(track_unknown(executor.map(extract_to_destination, track_sized(table.get_encrypted_epubs()))))
+    epubs = table.get_encrypted_epubs()
+    with ThreadPoolExecutor(max_workers=io_workers(len(epubs))) as executor:
+        errs = list(track_unknown(executor.map(extract_to_destination, track_sized(epubs))))
         print_error(str(sum(errs)))
         print_success(str(len(errs)))
 
@@ -157,10 +165,10 @@ def translate_epub(
     # remove ttf font from contents.opf
     #
     try:
-        new_epub = epub.extract().translate(dictionary).rename(new_name).compress(translated_dir)
+        new_epub = epub.extract().translate(dictionary).rename(new_name).compress(ensure_directory(translated_dir))
     except Exception as e:
         print_error(str(e))
-    epub.move_original_to(untranslated_dir)
+    epub.move_original_to(ensure_directory(untranslated_dir))
     return new_epub
 
 
@@ -219,15 +227,18 @@ def translate_all_encrypted(
         )
 
 
+def hash_file(path: Path) -> int:
+    return string_to_int_hash64(path.read_bytes())
+
+
 def search_duplicates(table: EpubBookTable):
     results = table.get_most_common(["filesize"], more_then=1)
     rows = table.get_many(table.model.filesize.in_(results))
     print(*[(row.filepath, row.filesize) for row in rows], sep="\n")
-    pairs = []
-    for row in rows:
-        path = Path(row.filepath)
-        h = string_to_int_hash64(path.read_bytes())
-        pairs.append((path, h, row.filesize))
+    paths = [Path(row.filepath) for row in rows]
+    with ThreadPoolExecutor(max_workers=io_workers(len(paths))) as executor:
+        hashes = list(executor.map(hash_file, paths))
+    pairs = [(path, h, row.filesize) for path, h, row in zip(paths, hashes, rows)]
     for pair in combinations(pairs, 2):
         (p1, h1, s1), (p2, h2, s2) = pair
         if s1 == s2 and h1 == h2:
@@ -287,7 +298,7 @@ def find_differences(epub1: Path, epub2: Path) -> bool:
     return True
 
 
-def find_differences_in_sizes(epub1: Path, epub2: Path) -> bool:
+def find_differences_in_sizes(epub1: Path, epub2: Path, messages: Messages) -> bool:
     dict1 = EPUB(epub1).file_identities_and_sizes_dict()
     dict2 = EPUB(epub2).file_identities_and_sizes_dict()
     folders = {
@@ -302,7 +313,7 @@ def find_differences_in_sizes(epub1: Path, epub2: Path) -> bool:
     if list(sorted(dict1.keys())) != list(sorted(dict2.keys())):
         set_list = (set(dict1.keys()) ^ set(dict2.keys())) - folders
         if set_list:
-            print_error(f"\t\tdiff fail, different files {list(set_list)[:10]}")
+            messages.append((print_error, f"\t\tdiff fail, different files {list(set_list)[:10]}"))
             return False
     diffs = []
     i1 = ((f, s, h) for f, (s, h) in sorted(dict1.items()) if f not in folders)
@@ -320,15 +331,18 @@ def find_differences_in_sizes(epub1: Path, epub2: Path) -> bool:
             diffs.append((f1, h1, h2))
             continue
         if f1 != f2:
-            print_error(f"paths are not equal for {epub1} and {epub2}")
+            messages.append((print_error, f"paths are not equal for {epub1} and {epub2}"))
             break
 
     if diffs:
-        print_error(f"\t\tdiff fail, different hashes: \n{'\n'.join(str(diff) for diff in diffs[:10])}")
+        listed = "\n".join(str(diff) for diff in diffs[:10])
+        messages.append((print_error, f"\t\tdiff fail, different hashes: \n{listed}"))
         return False
     if not diffs:
         avg_ratio = int(sum(ratios) / len(ratios)) if len(ratios) else 0
-        print_success(f"\t\tdiff success (avg html ratio {avg_ratio}), total files ({len(dict1)}) for {epub1}")
+        messages.append(
+            (print_success, f"\t\tdiff success (avg html ratio {avg_ratio}), total files ({len(dict1)}) for {epub1}")
+        )
     return True
 
 
@@ -336,32 +350,46 @@ def scan_folder(path: Path | None = None):
     path = path or epub_dir
     print_success(f"Scanning {path}...")
     with DisplayProgress(), EpubContentsTable() as contents_table, EpubBookTable() as book_table:
-        scanning = ScanEpubsInDirectory(path, workers=4)
-        contents_table.write_from_queue_in_thread(track_batch_queue(scanning.queue, TERMINATOR))
+        scanning = ScanEpubsInDirectory(path, workers=os.cpu_count() or 4, processes=True)
+        contents_table.write_from_queue_in_thread(track_batch_queue(scanning.queue, TERMINATOR, chunked=True))
         book_list = scanning.do_scan_with_progress()
         contents_table.await_write_completion()
         book_table.upsert_many_dicts(track_batch_sized([row.model_dump() for row in book_list]))
 
 
-def compare_epubs():
-    translated_paths = [path for path in translated_directory.glob("*.epub")]
+def compare_with_translation(path: Path) -> tuple[Path | None, Messages]:
+    """
+    Compares an untranslated epub with its translated double, returns the double's path if it exists.
+    Messages are returned rather than printed, so one book's lines stay together when run in threads.
+    """
+    messages: Messages = []
+    expected_path = translated_directory / new_decoded_name(path)
+    if not expected_path.exists():
+        messages.append((print_error, f"\tno double for {path.name}, {expected_path.name} does not exist"))
+        return None, messages
+    size = path.stat().st_size
+    ratio = (expected_path.stat().st_size / size) * 100
+    if ratio < 25:
+        weight = f"weight: {int(ratio)}% of the {size / 1024 / 1024:.2f} MB original, the {expected_path} is"
+        messages.append((print_success, weight))
+        find_differences_in_sizes(path, expected_path, messages)
+    return expected_path, messages
 
-    for path in untranslated_directory.glob("*.epub"):
-        new_name = new_decoded_name(path)
-        expected_path = translated_directory / new_name
-        if not expected_path.exists():
-            print_error(f"\tno double for {path.name}, {expected_path.name} does not exist")
-            continue
-        if expected_path in translated_paths:
-            translated_paths.remove(expected_path)
-        else:
-            print_error(f"existence: {expected_path} exists but not in translated_directory")
-        ratio = (expected_path.stat().st_size / path.stat().st_size) * 100
-        if ratio < 25:
-            print_success(
-                f"weight: {int(ratio)}% of the {path.stat().st_size / 1024 / 1024:.2f} MB original, the {expected_path} is"
-            )
-            find_differences_in_sizes(path, expected_path)
+
+def compare_epubs():
+    translated_paths = set(translated_directory.glob(epub_glob))
+    paths = list(untranslated_directory.glob(epub_glob))
+
+    with ThreadPoolExecutor(max_workers=io_workers(len(paths))) as executor:
+        for expected_path, messages in executor.map(compare_with_translation, paths):
+            for printer, message in messages:
+                printer(message)
+            if expected_path is None:
+                continue
+            if expected_path in translated_paths:
+                translated_paths.remove(expected_path)
+            else:
+                print_error(f"existence: {expected_path} exists but not in translated_directory")
 
     if translated_paths:
         print_error(f"\t{translated_paths}")
@@ -376,7 +404,7 @@ def return_untranslated_back(table: EpubBookTable):
         path1 = untranslated_directory / table_path.name
 
         tr_path = translated_directory / new_decoded_name(table_path)
-        new_tr_path = translated_r_directory / tr_path.name
+        new_tr_path = ensure_directory(translated_r_directory) / tr_path.name
         if path1 == table_path:
             skipped += 1
             continue
@@ -395,7 +423,7 @@ def return_untranslated_back(table: EpubBookTable):
 
 
 def move_remains():
-    for epub in untranslated_directory.glob("*.epub"):
+    for epub in untranslated_directory.glob(epub_glob):
         dtfrom = datetime.datetime.strptime("2026-01-21 00:00:00", "%Y-%m-%d %H:%M:%S")
         dtto = datetime.datetime.strptime("2026-01-21 01:00:00", "%Y-%m-%d %H:%M:%S")
         dt = datetime.datetime.fromtimestamp(epub.stat().st_ctime)
@@ -405,7 +433,7 @@ def move_remains():
                 epub.rename(epub_dir / "21.01.26 f h" / epub.name)
                 tr_path = translated_directory / new_decoded_name(epub)
                 if tr_path.exists():
-                    tr_path.rename(translated_r_directory / tr_path.name)
+                    tr_path.rename(ensure_directory(translated_r_directory) / tr_path.name)
             except Exception as e:
                 print_error(f"epub {epub.stem} error: {e}")
 
@@ -432,8 +460,8 @@ def extract_opf_to_destination(epub_path: Path, opf_path: str | None = None) ->
 def extract_package_files():
     destination = settings.profile_dir / "epub" / "opf"
     destination.mkdir(parents=True, exist_ok=True)
-    epub_paths = list(epub_dir.rglob("*.epub"))
-    with DisplayProgress(), ThreadPoolExecutor(max_workers=12) as executor:
+    epub_paths = [Path(entry.path) for entry in scan_files(epub_dir, epub_glob, ignore_case=True)]
+    with DisplayProgress(), ThreadPoolExecutor(max_workers=io_workers(len(epub_paths))) as executor:
         errs = list(track_unknown(executor.map(extract_opf_to_destination, epub_paths), total=len(epub_paths)))
         print_error(str(sum(errs)))
         print_success(str(len(errs)))
@@ -464,8 +492,8 @@ def extract_nav_to_destination(epub_path: Path) -> bool:
 def extract_nav_files():
     destination = settings.profile_dir / "epub" / "nav"
     destination.mkdir(parents=True, exist_ok=True)
-    epub_paths = list(epub_dir.rglob("*.epub"))
-    with DisplayProgress(), ThreadPoolExecutor(max_workers=12) as executor:
+    epub_paths = [Path(entry.path) for entry in scan_files(epub_dir, epub_glob, ignore_case=True)]
+    with DisplayProgress(), ThreadPoolExecutor(max_workers=io_workers(len(epub_paths))) as executor:
         errs = list(track_unknown(executor.map(extract_nav_to_destination, epub_paths), total=len(epub_paths)))
         print_error(str(sum(errs)))
         print_success(str(len(errs)))
@@ -477,12 +505,12 @@ def extract_ncx_to_destination(epub_path: Path) -> bool:
         return True
     with ZipFile(epub_path) as epub_zip:
         try:
-            for filename in epub_zip.namelist():
-                if not filename.endswith(".ncx"):
+            for info in epub_zip.infolist():
+                if not info.filename.endswith(".ncx"):
                     continue
-                f_bytes = epub_zip.read(filename)
+                f_bytes = epub_zip.read(info)
                 f_hash = to_hex_hash(f_bytes)
-                new_filepath = settings.profile_dir / "epub" / "ncx" / f"{f_hash}_{Path(filename).name}"
+                new_filepath = settings.profile_dir / "epub" / "ncx" / f"{f_hash}_{Path(info.filename).name}"
                 if not new_filepath.exists():
                     new_filepath.write_bytes(f_bytes)
         except Exception as e:
@@ -494,8 +522,8 @@ def extract_ncx_to_destination(epub_path: Path) -> bool:
 def extract_ncx_files():
     destination = settings.profile_dir / "epub" / "ncx"
     destination.mkdir(parents=True, exist_ok=True)
-    epub_paths = list(epub_dir.rglob("*.epub"))
-    with DisplayProgress(), ThreadPoolExecutor(max_workers=12) as executor:
+    epub_paths = [Path(entry.path) for entry in scan_files(epub_dir, epub_glob, ignore_case=True)]
+    with DisplayProgress(), ThreadPoolExecutor(max_workers=io_workers(len(epub_paths))) as executor:
         errs = list(track_unknown(executor.map(extract_ncx_to_destination, epub_paths), total=len(epub_paths)))
         print_error(str(sum(errs)))
         print_success(str(len(errs)))
@@ -558,15 +586,22 @@ def analize_opf_metadata(path: Path):
     all_contents.append(contents)
 
 
+def write_rows_to_csv(path: Path, rows: list[dict]) -> None:
+    if not rows:
+        return
+    with path.open("w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
 def parse_opf_metadata():
     source = settings.profile_dir / "epub" / "opf"
     opf_paths = list(source.glob("*.opf"))
-    with DisplayProgress(), ThreadPoolExecutor(max_workers=12) as executor:
+    with DisplayProgress(), ThreadPoolExecutor(max_workers=io_workers(len(opf_paths))) as executor:
         list(track_unknown(executor.map(analize_opf_metadata, opf_paths), total=len(opf_paths)))
-    lengths_df = pd.DataFrame(all_length)
-    contents_df = pd.DataFrame(all_contents)
-    lengths_df.to_csv(settings.profile_dir / "opf_metadata_l.csv")
-    contents_df.to_csv(settings.profile_dir / "opf_metadata_c.csv")
+    write_rows_to_csv(settings.profile_dir / "opf_metadata_l.csv", all_length)
+    write_rows_to_csv(settings.profile_dir / "opf_metadata_c.csv", all_contents)
 
 
 def extract_container_to_destination(epub_path: Path) -> bool:
@@ -587,8 +622,8 @@ def extract_container_to_destination(epub_path: Path) -> bool:
 def extract_container_files():
     destination = settings.profile_dir / "epub" / "container"
     destination.mkdir(parents=True, exist_ok=True)
-    epub_paths = list(epub_dir.rglob("*.epub"))
-    with DisplayProgress(), ThreadPoolExecutor(max_workers=12) as executor:
+    epub_paths = [Path(entry.path) for entry in scan_files(epub_dir, epub_glob, ignore_case=True)]
+    with DisplayProgress(), ThreadPoolExecutor(max_workers=io_workers(len(epub_paths))) as executor:
         errs = list(track_unknown(executor.map(extract_container_to_destination, epub_paths), total=len(epub_paths)))
         print_error(str(sum(errs)))
         print_success(str(len(errs)))
@@ -1,3 +1,4 @@
+import os
 import re
 from typing import Any
 from pathlib import Path
@@ -7,6 +8,9 @@ from sqlmodel import SQLModel, Field, Relationship
 from epub.utils import timestamp_from_zip_info, string_to_int_hash, bt_to_mb
 from library.database.sqlite_model_table import SQLiteModelTable
 
+BRACKETED_RE = re.compile(r"\[.*?\]|\(.*?\)")
+CHAPTER_RANGE_RE = re.compile(r"\d+-\d+")
+
 
 class EpubFileModel(SQLModel, table=True):
     __tablename__ = "epub_files"
@@ -33,8 +37,8 @@ class EpubFileModel(SQLModel, table=True):
     contents: list[EpubContentsModel] = Relationship(back_populates="book")
 
     @classmethod
-    def from_path(cls, path: Path) -> EpubFileModel:
-        stat = path.stat()
+    def from_path(cls, path: Path, stat: os.stat_result | None = None) -> EpubFileModel:
+        stat = stat or path.stat()
         return cls(
             id=string_to_int_hash(str(path)),
             filepath=str(path.absolute()),
@@ -44,15 +48,22 @@ class EpubFileModel(SQLModel, table=True):
         )
 
     def process_filenames(self, filenames: list[str]) -> None:
+        opfs, ncxs, serene_panda = [], [], []
+        for fn in filenames:
+            if fn.endswith(".opf"):
+                opfs.append(fn)
+            elif fn.endswith(".ncx"):
+                ncxs.append(fn)
+            elif fn.lower().endswith("serenepanda.ttf"):
+                serene_panda.append(fn)
         self.mimetype = "mimetype" in filenames
         self.container = "META-INF/container.xml" in filenames
-        self.content = "content.opf" in filenames
+        self.content = "content.opf" in opfs
         if not self.content:
-            self.opf = "".join(fn for fn in filenames if fn.endswith(".opf"))
-        self.toc = "toc.ncx" in filenames
+            self.opf = "".join(opfs)
+        self.toc = "toc.ncx" in ncxs
         if not self.toc:
-            self.ncx = "".join(fn for fn in filenames if fn.endswith(".ncx"))
-        serene_panda = [fn for fn in filenames if fn.lower().endswith("serenepanda.ttf")]
+            self.ncx = "".join(ncxs)
         self.serene_panda = bool(serene_panda)
         if serene_panda:
             self.serene_panda_ttf = serene_panda[0]
@@ -87,10 +98,10 @@ class EpubFileModel(SQLModel, table=True):
         return list(map(str, self.as_dict().values()))  # TODO: proper formatting
 
     def comparable_string(self) -> str:
-        string = Path(self.filepath).stem + " " + self.title
+        string = Path(self.filepath).stem + " " + (self.title or "")
         string = string.replace("_", " ").replace("+", " ").replace("  ", " ").strip()
-        string = re.sub(r"\[.*?\]|\(.*?\)", "", string)
-        string = re.sub(r"\d+-\d+", "", string)
+        string = BRACKETED_RE.sub("", string)
+        string = CHAPTER_RANGE_RE.sub("", string)
         string = "".join(map(lambda x: x if x.isalnum() else " ", string)).replace("  ", " ")
         return string.strip().lower()
 
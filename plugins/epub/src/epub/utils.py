@@ -1,4 +1,5 @@
 import logging
+import os
 from datetime import datetime
 from hashlib import md5
 from struct import unpack
@@ -9,6 +10,12 @@ logger = logging.getLogger(__name__)
 SQLITE_MAX_INT = 2**63 - 1
 SQLITE_MIN_INT = -(2**63)
 SIXTY_FOUR_BIT_MASK = 0xFFFFFFFFFFFFFFFF
+BYTES_IN_MB = 1024 * 1024
+
+
+def io_workers(tasks: int) -> int:
+    """Thread count for I/O bound file work: scaled to the cpu count, but never more threads than tasks."""
+    return max(1, min(32, (os.cpu_count() or 4) * 2, tasks))
 
 
 def ts_to_dt(ts: float) -> str:
@@ -16,7 +23,7 @@ def ts_to_dt(ts: float) -> str:
 
 
 def bt_to_mb(size_in_bytes: int) -> str:
-    return f"{size_in_bytes / (1024 * 1024):.2f} mb"
+    return f"{size_in_bytes / BYTES_IN_MB:.2f} mb"
 
 
 def to_hash(data: str | bytes) -> bytes:
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest
+
+from epub.chapter_processor import EpubChapter
+
+
+@pytest.mark.parametrize(
+    "markup, expected",
+    [
+        ('<img alt="x > y" src="../Images/a.png"/>', '<img alt="x > y" src="../Images/a.jpg"/>'),
+        ("<img alt='x > y' src='../Images/a.png'/>", "<img alt='x > y' src='../Images/a.jpg'/>"),
+        ('<IMG SRC="../Images/a.png">', '<IMG SRC="../Images/a.jpg">'),
+        ('<svg:img class="i" src = "../Images/a.png"/>', '<svg:img class="i" src = "../Images/a.jpg"/>'),
+        ('<img src="../Images/b&amp;c.png"/>', '<img src="../Images/b&amp;c.jpg"/>'),
+    ],
+)
+def test_update_image_references(tmp_path: Path, markup: str, expected: str):
+    path = tmp_path / "chapter.xhtml"
+    path.write_text(f"<html><body><p>before</p>{markup}<p>after</p></body></html>", encoding="utf-8")
+    chapter = EpubChapter(path)
+    assert chapter.update_image_references({"a.png": "a.jpg", "b&c.png": "b&c.jpg"})
+    assert chapter.references_updated == 1
+    assert path.read_text(encoding="utf-8") == f"<html><body><p>before</p>{expected}<p>after</p></body></html>"
+
+
+def test_update_image_references_leaves_other_attributes(tmp_path: Path):
+    markup = '<img data-src="../Images/a.png" alt="src=\'../Images/a.png\'" src="../Images/other.png"/>'
+    path = tmp_path / "chapter.xhtml"
+    path.write_text(markup, encoding="utf-8")
+    chapter = EpubChapter(path)
+    assert chapter.update_image_references({"a.png": "a.jpg"})
+    assert chapter.references_updated == 0
+    assert path.read_text(encoding="utf-8") == markup
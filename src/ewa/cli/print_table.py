@@ -1,11 +1,15 @@
+from __future__ import annotations
+
 import shutil
-import pandas as pd
 
-from typing import Any
+from typing import Any, TYPE_CHECKING
 from rich.table import Table
 from sqlmodel import SQLModel
 from ewa.ui import console
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def print_table(title: str, columns: list[str], rows: list[list]):
     """Prints a styled table."""
@@ -1,7 +1,7 @@
 import builtins
 import time
 from collections.abc import Iterator
-from itertools import batched
+from itertools import batched, chain
 from queue import Queue
 
 from rich.progress import Progress, TextColumn, TimeElapsedColumn, BarColumn, MofNCompleteColumn, TaskProgressColumn
@@ -73,13 +73,21 @@ class DisplayProgress(Progress):
 
 
 def track_batch_queue(
-    queue: Queue[T], terminator: object, name: str = "queue", batch_size: int = 1000
+    queue: Queue[T] | Queue[list[T]],
+    terminator: object,
+    name: str = "queue",
+    batch_size: int = 1000,
+    chunked: bool = False,
 ) -> Iterable[tuple[T]]:
+    """Batches items from a queue until the terminator. With chunked, producers put lists of items."""
     task_name = f"[cyan]Writing {name}"
     processed = 0
     start_time = time.time()
     print(f"[cyan]Starting processing {name} task")
-    for batch in batched(iter(queue.get, terminator), batch_size):
+    items = iter(queue.get, terminator)
+    if chunked:
+        items = chain.from_iterable(items)
+    for batch in batched(items, batch_size):
         processed += len(batch)
         yield batch
         print(task_name, processed, processed + queue.qsize())
@@ -1,21 +1,38 @@
 import importlib.metadata
+from concurrent.futures import ThreadPoolExecutor
+
 import typer
 from ewa.ui import print_success, print_error
 
 PLUGIN_GROUP = "ewa.plugins"
 
 
-def load_plugins(main_app: typer.Typer):
-    """Discovers and mounts plugins to the main app."""
+def load_plugins(main_app: typer.Typer, requested: str | None = None):
+    """Discovers and mounts plugins to the main app.
+
+    If `requested` names one of the plugins, only that plugin is imported,
+    otherwise every plugin is loaded (help output, repl, etc.).
+    """
     if hasattr(importlib.metadata, "entry_points"):
         eps = importlib.metadata.entry_points()
         plugins = eps.select(group=PLUGIN_GROUP)
+        if requested is not None and requested in plugins.names:
+            plugins = plugins.select(name=requested)
     else:
         plugins = []
 
-    for entry_point in plugins:
+    plugins = list(plugins)
+    if len(plugins) > 1:
+        # imports of independent plugins overlap on file I/O, mounting stays in order
+        with ThreadPoolExecutor(max_workers=min(8, len(plugins))) as executor:
+            loaded = list(executor.map(_load_entry_point, plugins))
+    else:
+        loaded = [_load_entry_point(entry_point) for entry_point in plugins]
+
+    for entry_point, plugin_app in loaded:
         try:
-            plugin_app = entry_point.load()
+            if isinstance(plugin_app, Exception):
+                raise plugin_app
             if isinstance(plugin_app, typer.Typer):
                 main_app.add_typer(plugin_app, name=entry_point.name)
                 print_success(f"{entry_point.name} loaded as app")
@@ -26,3 +43,10 @@ def load_plugins(main_app: typer.Typer):
                 print_success(f"{entry_point.name} loaded as callable")
         except Exception as e:
             print_error(f"Failed to load plugin {entry_point.name}: {e}")
+
+
+def _load_entry_point(entry_point: importlib.metadata.EntryPoint):
+    try:
+        return entry_point, entry_point.load()
+    except Exception as e:
+        return entry_point, e
@@ -1,3 +1,4 @@
+import sys
 import typer
 import shlex
 from ewa.ui import console
@@ -38,7 +39,7 @@ def repl(ctx: typer.Context):
 
 
 def main():
-    load_plugins(app)
+    load_plugins(app, requested=sys.argv[1] if len(sys.argv) > 1 else None)
     app()
 
 